@@ -19,31 +19,151 @@ FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTH
 LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS 
 IN THE SOFTWARE.
 """
-import os,stat,subprocess,optparse,textwrap
+import os,sys
+#argparse is in the standard library from python 2.7 and 3.2, checked without importing it to keep imports fast
+ARGPARSE=sys.version_info[:2]>=(3,2) or (2,7)<=sys.version_info[:2]<(3,0)
 try:
-    import argparse
-    ARGPARSE=True
-except:
-    ARGPARSE=False
+    from .backends import get_backend,mpi_layout,QsubError
+    from .metrics import timed,markers
+except (ImportError,ValueError,SystemError):
+    from backends import get_backend,mpi_layout,QsubError
+    from metrics import timed,markers
 def make_optstr(options,options_map,list_delimiter=','):
     optstr=[]
-    for key in options.keys():        
-        if 'qsub' in key:
-            continue 
-        elif key in options_map.keys() and not len(options_map[key]):
-            optstr.append(str(options[key]))
-        elif key in options_map.keys() and type(options[key])==list:
-            optstr.append(options_map[key]+'='+list_delimiter.join(options[key]))#Is this optparse proof - works on cluster
-        elif key in options_map.keys() and type(options[key])!=bool:
-            optstr.append(options_map[key]+'='+str(options[key]))
-        elif key in options_map.keys() and options[key]:
-            optstr.append(options_map[key])
+    for key in options:
+        if 'qsub' in key or key not in options_map:
+            continue
+        option=format_option(options_map[key],options[key],list_delimiter)
+        if option is not None:
+            optstr.append(option)
     optstr=' '.join(optstr)
     return optstr
+def format_option(flag,value,list_delimiter=','):
+    """Formats a single option flag and value for the job command line
+
+    Args:
+        flag: str option flag (an empty flag means value is a positional argument)
+        value: option value
+        list_delimiter: str value to separate lists [default=,]
+
+    Returns
+        option: str option string or None if the option is a False boolean flag
+
+    """
+    if not len(flag):
+        return str(value)
+    elif type(value)==list:
+        return flag+'='+list_delimiter.join(value)#Is this optparse proof - works on cluster
+    elif type(value)!=bool:
+        return flag+'='+str(value)
+    elif value:
+        return flag
+    return None
+def make_script(options,options_map={},module_name=False,job_string=False,list_delimiter=','):
+    """Makes the pbs script for a job
+
+    Args:
+        options: dict of options and values
+        options_map: dict mapping options to flags for job
+        module_name: str module name for job
+        list_delimiter: str value to separate lists [default=,]
+
+    Optional Args:
+        job_string: str alternate argument to options_map and module_name - provide the executable and arguments string for the qsub script itself.
+
+    Returns
+        qsub_script: str pbs script
+
+    """
+    with timed('render',name=options['qsub_N']):
+        if job_string:
+            return make_header(options)+job_string
+        with timed('make_optstr',name=options['qsub_N']):
+            optstr=make_optstr(options,options_map,list_delimiter)
+        return make_header(options)+module_command(options,module_name)+optstr+'\n'
+def make_header(options):
+    """Makes the job script header and prologue from the qsub options
+
+    The scheduler directives are rendered by the backend set by the qsub_backend option (default pbs). Raises a ValueError if the
+    hybrid MPI/OpenMP layout (qsub_ranks_per_node and qsub_threads) does not fit in qsub_ppn.
+
+    Args:
+        options: dict of options and values
+
+    Returns
+        header: str job script header
+
+    """
+    qsub_script="#!/bin/bash\n##"+str(options['qsub_N'])+" qsub script\n"
+    if options.get('qsub_ranks_per_node') or options.get('qsub_threads'):
+        mpi_layout(options)#Check the hybrid MPI/OpenMP layout fits in ppn
+    qsub_script+=get_backend(options.get('qsub_backend','pbs')).directives(options)
+    qsub_script+=make_prologue(options)
+    return qsub_script
+def make_prologue(options):
+    """Makes the job prologue from the qsub options
+
+    The prologue prints start and end time markers if qsub_timestamps is set (see pyqsub.metrics), changes to the working directory (qsub_workdir, default $HOME), loads modules (qsub_modules), sets environment variables (qsub_env) and OMP_NUM_THREADS (qsub_threads),
+    runs any prologue commands (qsub_prologue), waits for the readiness checks (qsub_ready) to succeed, polling every second for up to
+    qsub_ready_timeout seconds, and finally sleeps for qsub_sleep seconds if set.
+
+    Args:
+        options: dict of options and values
+
+    Returns
+        prologue: str job prologue
+
+    """
+    prologue=markers() if options.get('qsub_timestamps',False) else ''
+    prologue+='cd '+str(options.get('qsub_workdir') or '$HOME')+'\n'
+    for module in options.get('qsub_modules') or []:
+        prologue+='module load '+module+'\n'
+    for variable in options.get('qsub_env') or []:
+        prologue+='export '+variable+'\n'
+    if options.get('qsub_threads'):
+        prologue+='export OMP_NUM_THREADS='+str(int(options['qsub_threads']))+'\n'
+    for command in options.get('qsub_prologue') or []:
+        prologue+=command+'\n'
+    for check in options.get('qsub_ready') or []:
+        prologue+='PYQSUB_WAIT=0\nuntil '+check+'\ndo\n    PYQSUB_WAIT=$((PYQSUB_WAIT+1))\n'
+        prologue+='    if [ $PYQSUB_WAIT -ge '+str(int(options.get('qsub_ready_timeout',60)))+' ]; then echo "pyqsub: readiness check timed out" >&2; exit 1; fi\n'
+        prologue+='    sleep 1\ndone\n'
+    if options.get('qsub_sleep',0):
+        prologue+='sleep '+str(options['qsub_sleep'])+'\n'
+    return prologue
+def module_command(options,module_name):
+    """Makes the command prefix to run module_name.__run__() (without the option flags)
+
+    If qsub_mpi is set, the command is run using mpirun (Open MPI syntax), mapping the ranks per node and threads per rank (--map-by ppr:R:node:PE=T)
+    unless qsub_map_by is set, and binding them if qsub_bind_to is set.
+
+    Args:
+        options: dict of options and values
+        module_name: str module name for job
+
+    Returns
+        command: str command prefix
+
+    """
+    command=''
+    if options.get('qsub_mpi',False): #MPI option if in options string
+        np,ranks_per_node,threads=mpi_layout(options)
+        command+='mpirun -n '+str(np)+' '
+        if options.get('qsub_map_by',False):
+            command+='--map-by '+options['qsub_map_by']+' '
+        elif options.get('qsub_ranks_per_node') or threads>1:
+            command+='--map-by ppr:'+str(ranks_per_node)+':node'+(':PE='+str(threads) if threads>1 else '')+' '
+        if options.get('qsub_bind_to',False):
+            command+='--bind-to '+options['qsub_bind_to']+' '
+        if options.get('qsub_threads'):
+            command+='-x OMP_NUM_THREADS '
+    return command+'python -c "import '+module_name.split('.')[0]+'; '+module_name.split('.')[0]+'.__run__()" '
 def submit(options,options_map={},module_name=False,job_string=False,list_delimiter=','):
     """Submits job to cluster
 
     Creates a pbs file and submits the job to the cluster, renaming the pbs file according to the job name and job id.
+    If the qsub_cache option is set and an identical job is queued, running, has completed successfully or is no longer listed by qstat,
+    the job is not submitted and the job id of the identical job is returned (unless the qsub_force option is set).
 
     Args:
         options: dict of options and values
@@ -54,43 +174,277 @@ def submit(options,options_map={},module_name=False,job_string=False,list_delimi
     Optional Args:
         job_string: str alternate argument to options_map and module_name - provide the executable and arguments string for the qsub script itself.
 
+    Returns
+        job_id: str job id returned by qsub
+
     """
     if not module_name and not job_string:
         raise TypeError("One of module_name and job_string must be specified.")
     if not job_string and module_name and not len(options_map):
         raise UserWarning("job_string not specified and options_map length is 0, no option flags will be appended to the pbs script ")
-    optstr=make_optstr(options,options_map,list_delimiter)
-    qsub_script="#!/bin/bash\n##"+str(options['qsub_N'])+" qsub script\n#PBS -S /bin/sh\n#PBS -N "+str(options['qsub_N'])+"\n#PBS -l walltime="+str(options['qsub_walltime'])+'\n'
-    qsub_script+='#PBS -V\n'
-    qsub_script+='#PBS -l nodes='+str(options['qsub_nodes'])+':ppn='+str(options['qsub_ppn'])
-    if options['qsub_blade_properties']:
-        qsub_script+=':'+options['qsub_blade_properties']
-    if options['qsub_blade_feature']:
-        qsub_script+=',feature='+options['qsub_blade_feature']
-    qsub_script+='\n'
-    if options['qsub_pmem']:
-        qsub_script+='#PBS -l pmem='+str(int(options['qsub_pmem']))+'Gb\n'
-    qsub_script+='#PBS -q '+options['qsub_q']+'\n'
-    if options['qsub_M']:
-        qsub_script+='#PBS -M '+options['qsub_M']+'\n#PBS -m '+options['qsub_m']+'\n'
-    qsub_script+='cd $HOME\nsleep 10\n'
+    advisor=None
+    if options.get('qsub_advisor',False):
+        advisor=resource_advisor(options['qsub_advisor'])
+        options=advisor.apply(options,module_name)
+    qsub_script=make_script(options,options_map,module_name,job_string,list_delimiter)
+    cache,job_id=cache_lookup(qsub_script,options)
+    if job_id is not None:
+        return job_id
+    print ('Script:\n===============\n\n'+qsub_script)
+    job_id=submit_script(qsub_script,options['qsub_N'],options.get('qsub_stdin',False),options.get('qsub_archive',False),options.get('qsub_backend','pbs'))
+    if cache is not None:
+        cache.add(qsub_script,job_id,options['qsub_N'])
+    if advisor is not None:
+        advisor.submitted(job_id,options,module_name)
+    return job_id
+def submit_array(options,options_map={},module_name=False,job_string=False,list_delimiter=','):
+    """Submits many jobs to the cluster as a single array job
+
+    Creates a task table with one line per job and a single pbs array script (#PBS -t 0-N) that reads its line from the table using
+    $PBS_ARRAYID, so that the jobs are submitted using one qsub call. The pbs file is renamed according to the job name and job id as in submit(),
+    but the task table is left in the current directory as it is needed when the jobs run.
+
+    All the jobs share the same pbs header, so the qsub options must be the same for every job.
+
+    Args:
+        options: list of dicts of options and values, one per job, or a single dict if job_string is a list
+        options_map: dict mapping options to flags for job
+        module_name: str module name for job
+        list_delimiter: str value to separate lists [default=,]
+
+    Optional Args:
+        job_string: list of single line job strings, one per job - alternate argument to options_map and module_name.
+
+    Returns
+        job_ids: list of job ids, one per job
+
+    """
+    if not module_name and not job_string:
+        raise TypeError("One of module_name and job_string must be specified.")
+    if not job_string and module_name and not len(options_map):
+        raise UserWarning("job_string not specified and options_map length is 0, no option flags will be appended to the pbs script ")
+    if isinstance(options,dict):
+        options=[options]*len(job_string)
+    else:
+        options=list(options)
+    if not len(options):
+        raise ValueError("No jobs to submit.")
+    qsub_options=dict((key,value) for key,value in options[0].items() if 'qsub' in key)
+    for job_options in options[1:]:
+        if dict((key,value) for key,value in job_options.items() if 'qsub' in key)!=qsub_options:
+            raise ValueError("qsub options must be the same for all jobs in an array.")
+    advisor=None
+    if qsub_options.get('qsub_advisor',False):
+        #Applied before module_command() so that the mpirun rank count matches the resources requested
+        advisor=resource_advisor(qsub_options['qsub_advisor'])
+        qsub_options=advisor.apply(qsub_options,module_name)
     if job_string:
-        qsub_script+=job_string
+        tasks=[task.rstrip('\n') for task in job_string]
+        if len(tasks)!=len(options):
+            raise ValueError("job_string and options must have the same length.")
+        command=''
     else:
-        if options.get('qsub_mpi',False): #MPI option if in options string
-            qsub_script+='mpirun -n '+str(options.get('qsub_np',options['qsub_nodes']*options['qsub_ppn']))+' '
-        qsub_script+='python -c "import '+module_name.split('.')[0]+'; '+module_name.split('.')[0]+'.__run__()" '+optstr+'\n'
+        tasks=[make_optstr(job_options,options_map,list_delimiter) for job_options in options]
+        command=module_command(qsub_options,module_name)
+    if any('\n' in task for task in tasks):
+        raise ValueError("Array job tasks must be single line.")
+    import tempfile
+    with timed('write',name=qsub_options['qsub_N']):
+        fd,table=tempfile.mkstemp(prefix=str(qsub_options['qsub_N'])+'_',suffix='.tasks',dir=os.getcwd())
+        with os.fdopen(fd,'w') as f:
+            f.write('\n'.join(tasks)+'\n')
+    qsub_options['qsub_t']='0-'+str(len(tasks)-1)
+    for char in '\\"$`':
+        command=command.replace(char,'\\'+char)
+    backend=get_backend(qsub_options.get('qsub_backend','pbs'))
+    with timed('render',name=qsub_options['qsub_N']):
+        qsub_script=make_header(qsub_options)
+        qsub_script+='PYQSUB_TASK=$(sed -n "$(('+backend.array_index.lstrip('$')+'+1))p" \''+table+'\')\n'
+        qsub_script+='eval "'+command+'$PYQSUB_TASK"\n'
     print ('Script:\n===============\n\n'+qsub_script)
-    open(options['qsub_N']+'_temp.pbs','w').write(qsub_script)
-    os.chmod(options['qsub_N']+'_temp.pbs', stat.S_IRWXO| stat.S_IRWXG|stat.S_IRWXU)
-    process=subprocess.Popen(["qsub",options['qsub_N']+"_temp.pbs"],stdout=subprocess.PIPE)
-    out,err=process.communicate()
-    print ('\n===============\nSubmitted job: '+out)
-    os.rename(options['qsub_N']+'_temp.pbs',options['qsub_N']+'.p'+out.rstrip('\n').split('.')[0])
-    return 0
-def parser_group(module_name,group,default_nodes=1,default_ppn=8,default_pmem=1,default_walltime="24:00:00",default_queue="auto",default_email=False,default_email_options="bae",default_properties=False,default_feature=False,*kwargs):
+    job_id=backend.submit_script(qsub_script,str(qsub_options['qsub_N']),qsub_options.get('qsub_stdin',False),qsub_options.get('qsub_archive',False),len(tasks))
+    job_ids=backend.array_ids(job_id,len(tasks))
+    if advisor is not None:
+        for task_id in job_ids:
+            advisor.submitted(task_id,qsub_options,module_name)
+    return job_ids
+class ScriptTemplate(object):
+    """Compiled pbs script template for submitting many similar jobs
+
+    The pbs header, the command prefix and the formatted option flags are rendered once from the default options, so rendering a job
+    only formats the options that differ from the defaults (e.g. the parameters of a sweep). Headers for changed qsub options are cached.
+
+    Args
+        options: dict of default options and values (e.g. the defaults from a parser including parser_group())
+        options_map: dict mapping options to flags for job
+        module_name: str module name for job
+        list_delimiter: str value to separate lists [default=,]
+
+    Optional Args:
+        job_string: str alternate argument to options_map and module_name - provide the executable and arguments string for the qsub script itself.
+
+    """
+    def __init__(self,options,options_map={},module_name=False,job_string=False,list_delimiter=','):
+        if not module_name and not job_string:
+            raise TypeError("One of module_name and job_string must be specified.")
+        self.options=dict(options)
+        self.options_map=options_map
+        self.module_name=module_name
+        self.job_string=job_string
+        self.list_delimiter=list_delimiter
+        self._keys=[key for key in self.options if 'qsub' not in key and key in options_map]
+        self._index=dict((key,i) for i,key in enumerate(self._keys))
+        self._parts=[format_option(options_map[key],self.options[key],list_delimiter) for key in self._keys]
+        self._optstr=' '.join(part for part in self._parts if part is not None)
+        self._prefixes={}
+        self._prefix=self._make_prefix({})
+    def _make_prefix(self,qsub_options):
+        #append options (e.g. qsub_modules) are lists, so are converted to tuples for the key
+        cache_key=tuple(sorted((key,tuple(value) if isinstance(value,list) else value) for key,value in qsub_options.items()))
+        try:
+            return self._prefixes[cache_key]
+        except KeyError:
+            pass
+        options=dict(self.options,**qsub_options) if qsub_options else self.options
+        prefix=make_header(options)
+        if not self.job_string:
+            prefix+=module_command(options,self.module_name)
+        self._prefixes[cache_key]=prefix
+        return prefix
+    def render(self,options=None,job_string=False):
+        """Renders the pbs script for a job
+
+        Args
+            options: dict of options and values that differ from the template defaults [default=None]
+            job_string: str job string to use instead of the template job string [default=False]
+
+        Returns
+            qsub_script: str pbs script
+
+        """
+        if not options:
+            prefix=self._prefix
+            optstr=self._optstr
+        else:
+            qsub_options=dict((key,value) for key,value in options.items() if 'qsub' in key)
+            prefix=self._make_prefix(qsub_options) if qsub_options else self._prefix
+            if self.job_string or job_string:
+                optstr=''
+            else:
+                parts=list(self._parts)
+                extra=[]
+                for key,value in options.items():
+                    if 'qsub' in key or key not in self.options_map:
+                        continue
+                    if key in self._index:
+                        parts[self._index[key]]=format_option(self.options_map[key],value,self.list_delimiter)
+                    else:
+                        extra.append(format_option(self.options_map[key],value,self.list_delimiter))
+                optstr=' '.join(part for part in parts+extra if part is not None)
+        if job_string or self.job_string:
+            return prefix+(job_string or self.job_string)
+        return prefix+optstr+'\n'
+    def submit(self,options=None,job_string=False):
+        """Submits a job rendered from the template to the cluster
+
+        Args
+            options: dict of options and values that differ from the template defaults [default=None]
+            job_string: str job string to use instead of the template job string [default=False]
+
+        Returns
+            job_id: str job id returned by qsub (or of an identical job if the qsub_cache option is set, see pyqsub.submit())
+
+        """
+        options=dict(self.options,**options) if options else self.options
+        qsub_script=self.render(options,job_string)
+        cache,job_id=cache_lookup(qsub_script,options)
+        if job_id is not None:
+            return job_id
+        job_id=submit_script(qsub_script,str(options['qsub_N']),options.get('qsub_stdin',False),options.get('qsub_archive',False),options.get('qsub_backend','pbs'))
+        if cache is not None:
+            cache.add(qsub_script,job_id,options['qsub_N'])
+        return job_id
+_advisors={}
+def resource_advisor(path):
+    """Returns the (cached) ResourceAdvisor for a database path
+
+    Args
+        path: str SQLite database path
+
+    Returns
+        advisor: ResourceAdvisor object
+
+    """
+    if path not in _advisors:
+        try:
+            from .advisor import ResourceAdvisor
+        except (ImportError,ValueError,SystemError):
+            from advisor import ResourceAdvisor
+        _advisors[path]=ResourceAdvisor(path)
+    return _advisors[path]
+_caches={}
+def submission_cache(path):
+    """Returns the (cached) SubmissionCache for a database path
+
+    Args
+        path: str SQLite database path
+
+    Returns
+        cache: SubmissionCache object
+
+    """
+    if path not in _caches:
+        try:
+            from .cache import SubmissionCache
+        except (ImportError,ValueError,SystemError):
+            from cache import SubmissionCache
+        _caches[path]=SubmissionCache(path)
+    return _caches[path]
+def cache_lookup(qsub_script,options):
+    """Looks up a job script in the submission cache set by the qsub_cache option
+
+    Args
+        qsub_script: str job script
+        options: dict of options and values
+
+    Returns
+        cache,job_id: SubmissionCache object (None if qsub_cache is not set) and the job id of an identical job (None if the job needs to be submitted)
+
+    """
+    if not options.get('qsub_cache',False):
+        return None,None
+    backend=options.get('qsub_backend','pbs')
+    if getattr(backend,'name',backend)!='pbs':
+        raise ValueError("The submission cache (qsub_cache) can only be used with the pbs backend, as the job states are read using qstat.")
+    cache=submission_cache(options['qsub_cache'])
+    job_id=None if options.get('qsub_force',False) else cache.lookup(qsub_script)
+    if job_id is not None:
+        print ('Skipped job: identical to '+job_id)
+    return cache,job_id
+def submit_script(qsub_script,name,stdin=False,archive=False,backend='pbs'):
+    """Submits a job script using the scheduler backend
+
+    By default the script is written to a pbs file, which is renamed according to the job name and job id after submission.
+    If stdin is set, the script is piped to qsub on stdin without writing a file. If archive is set, the script is appended to
+    the archive (see pyqsub.archive.Archive) keyed by the job id, rather than keeping a pbs file for each job.
+
+    Args:
+        qsub_script: str pbs script
+        name: str job name
+        stdin: bool pipe the script to qsub on stdin [default=False]
+        archive: str archive file path or pyqsub.archive.Archive object [default=False]
+        backend: str backend name (pbs, slurm or local) or pyqsub.backends.Backend object [default=pbs]
+
+    Returns
+        job_id: str job id returned by qsub
+
+    """
+    return get_backend(backend).submit_script(qsub_script,name,stdin,archive)
+def parser_group(module_name,group,default_nodes=1,default_ppn=8,default_pmem=1,default_walltime="24:00:00",default_queue="auto",default_email=False,default_email_options="bae",default_properties=False,default_feature=False,default_backend="pbs",*kwargs):
     """Adds parser group for qsub arguments
 
+    The job setup, scheduler and submission flags are prefixed with --qsub- so they do not clash with the flags of the module.
+
     Args
         module_name: str Module name for help strings and default job name.
         group: argparser argument group object generated using parser.add_argument_group() or optparse.OptionGroup object
@@ -102,39 +456,67 @@ def parser_group(module_name,group,default_nodes=1,default_ppn=8,default_pmem=1,
         default_email: str default email to use for qsub (#PBS -M email) [default=False]
         default_email_options: str default email_options to use for qsub (#PBS -m opts) [default=bae]
         default_properties: str default blade properties for submission qsub (#PBS -l nodes=nodes:ppn=ppn:properties) [default=False]
+        default_feature: str default Torque feature for submission qsub (#PBS -l nodes=nodes:ppn=ppn,feature=feature) [default=False]
+        default_backend: str default scheduler backend (pbs, slurm or local) [default=pbs]
 
     Returns
         group: argparse or optparse argument group
 
     """ 
-    if ARGPARSE and isinstance(group,argparse._ArgumentGroup):
-        group.add_argument("-q","--qsub","--pbs",default=False,help="Flag to set "+module_name+" to submit to cluster",action='store_true',dest="qsub")
-        group.add_argument("--nodes",default=default_nodes,help="Set number of nodes to use for job submission. [default="+str(default_nodes)+"]",type=int,dest="qsub_nodes")
-        group.add_argument("--ppn",default=default_ppn,help="Set ppn to use for job submission. [default="+str(default_ppn)+"]",type=int,dest="qsub_ppn")
-        group.add_argument("--pmem",default=default_pmem,help="Set pmem (Gb) to use for job submission.  [default="+str(default_pmem)+"Gb]",type=float,dest="qsub_pmem")
-        group.add_argument("--email",default=default_email,help="Set user email address.",type=str,dest="qsub_M")
-        group.add_argument("--emailoptions",default=default_email_options,help="Set PBS -m mail options. Requires email address using -M. [default=bae]",type=str,dest="qsub_m")
-        group.add_argument("--name",default=module_name,help="Set PBS -N job name options. [default="+module_name+"]",type=str,dest="qsub_N")
-        group.add_argument("--walltime",default=default_walltime,help="Set PBS maximum wall time. Needs to be of the form HH:MM:SS. [default="+default_walltime+"]",type=str,dest="qsub_walltime")
-        group.add_argument("--queue",default=default_queue,help="Set PBS -q Queue options. [default="+default_queue+"]",type=str,dest="qsub_q") 
-        group.add_argument("--bladeproperties",default=default_properties,help="Set desired PBS blade properties. [default="+str(default_properties)+"]",type=str,dest="qsub_blade_properties")
-        group.add_argument("--feature",default=default_feature,help="Set desired Torque feature arguments. [default="+str(default_feature)+"]",type=str,dest="qsub_blade_feature")
-        return group   
+    if ARGPARSE and hasattr(group,'add_argument'):
+        add_option=group.add_argument
     else:
-        group.add_option("-q","--qsub","--pbs",default=False,help="Flag to set "+module_name+" to submit to cluster",action='store_true',dest="qsub")
-        group.add_option("--nodes",default=default_nodes,help="Set number of nodes to use for job submission. [default="+str(default_nodes)+"]",type=int,dest="qsub_nodes")
-        group.add_option("--ppn",default=default_ppn,help="Set ppn to use for job submission. [default="+str(default_ppn)+"]",type=int,dest="qsub_ppn")
-        group.add_option("--pmem",default=default_pmem,help="Set pmem (Gb) to use for job submission.  [default="+str(default_pmem)+"Gb]",type=float,dest="qsub_pmem")
-        group.add_option("--email",default=default_email,help="Set user email address.",type=str,dest="qsub_M")
-        group.add_option("--emailoptions",default=default_email_options,help="Set PBS -m mail options. Requires email address using -M. [default=bae]",type=str,dest="qsub_m")
-        group.add_option("--name",default=module_name,help="Set PBS -N job name options. [default="+module_name+"]",type=str,dest="qsub_N")
-        group.add_option("--walltime",default=default_walltime,help="Set PBS maximum wall time. Needs to be of the form HH:MM:SS. [default="+default_walltime+"]",type=str,dest="qsub_walltime")
-        group.add_option("--queue",default=default_queue,help="Set PBS -q Queue options. [default="+default_queue+"]",type=str,dest="qsub_q")   
-        group.add_option("--bladeproperties",default=default_properties,help="Set desired PBS blade properties. [default="+str(default_properties)+"]",type=str,dest="qsub_blade_properties")
-        group.add_option("--feature",default=default_feature,help="Set desired Torque feature arguments. [default="+str(default_feature)+"]",type=str,dest="qsub_blade_feature")
-        return group
-def __run__(inputArgs=[]):
-    if ARGPARSE:
+        add_option=group.add_option
+    add_option("-q","--qsub","--pbs",default=False,help="Flag to set "+module_name+" to submit to cluster",action='store_true',dest="qsub")
+    add_option("--nodes",default=default_nodes,help="Set number of nodes to use for job submission. [default="+str(default_nodes)+"]",type=int,dest="qsub_nodes")
+    add_option("--ppn",default=default_ppn,help="Set ppn to use for job submission. [default="+str(default_ppn)+"]",type=int,dest="qsub_ppn")
+    add_option("--pmem",default=default_pmem,help="Set pmem (Gb) to use for job submission.  [default="+str(default_pmem)+"Gb]",type=float,dest="qsub_pmem")
+    add_option("--email",default=default_email,help="Set user email address.",type=str,dest="qsub_M")
+    add_option("--emailoptions",default=default_email_options,help="Set PBS -m mail options. Requires email address using -M. [default=bae]",type=str,dest="qsub_m")
+    add_option("--name",default=module_name,help="Set PBS -N job name options. [default="+module_name+"]",type=str,dest="qsub_N")
+    add_option("--walltime",default=default_walltime,help="Set PBS maximum wall time. Needs to be of the form HH:MM:SS. [default="+default_walltime+"]",type=str,dest="qsub_walltime")
+    add_option("--queue",default=default_queue,help="Set PBS -q Queue options. [default="+default_queue+"]",type=str,dest="qsub_q")
+    add_option("--bladeproperties",default=default_properties,help="Set desired PBS blade properties. [default="+str(default_properties)+"]",type=str,dest="qsub_blade_properties")
+    add_option("--feature",default=default_feature,help="Set desired Torque feature arguments. [default="+str(default_feature)+"]",type=str,dest="qsub_blade_feature")
+    add_option("--qsub-stdin",default=False,help="Flag to pipe the pbs script to qsub on stdin rather than writing a pbs file.",action='store_true',dest="qsub_stdin")
+    add_option("--qsub-workdir",default="$HOME",help="Set the directory the job runs in. [default=$HOME]",type=str,dest="qsub_workdir")
+    add_option("--qsub-loadmodule",default=None,help="Environment module to load at the start of the job (module load). Can be repeated.",action='append',dest="qsub_modules")
+    add_option("--qsub-env",default=None,help="Environment variable to set at the start of the job, of the form NAME=VALUE. Can be repeated.",action='append',dest="qsub_env")
+    add_option("--qsub-prologue",default=None,help="Command to run at the start of the job, before the job command. Can be repeated.",action='append',dest="qsub_prologue")
+    add_option("--qsub-ready",default=None,help="Readiness check command, the job waits until it succeeds before running (e.g. \"test -d /scratch\"). Can be repeated.",action='append',dest="qsub_ready")
+    add_option("--qsub-readytimeout",default=60,help="Set the time in seconds to wait for the readiness checks before the job fails. [default=60]",type=int,dest="qsub_ready_timeout")
+    add_option("--qsub-sleep",default=0,help="Set a fixed time in seconds to sleep at the start of the job. [default=0]",type=int,dest="qsub_sleep")
+    add_option("--qsub-timestamps",default=False,help="Flag to print start and end time markers to the job stderr, to measure queue wait and run time.",action='store_true',dest="qsub_timestamps")
+    add_option("--qsub-ranks",default=0,help="Set the number of MPI ranks per node for hybrid MPI/OpenMP jobs. [default=ppn/threads]",type=int,dest="qsub_ranks_per_node")
+    add_option("--qsub-threads",default=0,help="Set the number of OpenMP threads per MPI rank (OMP_NUM_THREADS). Ranks x threads must fit in ppn. [default=1]",type=int,dest="qsub_threads")
+    add_option("--qsub-mapby",default=False,help="Set the mpirun --map-by policy (e.g. socket). [default=ppr:ranks:node:PE=threads]",type=str,dest="qsub_map_by")
+    add_option("--qsub-bindto",default=False,help="Set the mpirun --bind-to policy (e.g. core, socket or none). [default=False]",type=str,dest="qsub_bind_to")
+    add_option("--qsub-depend",default=False,help="Set job dependencies in the scheduler format, e.g. afterok:1234.server (PBS -W depend). [default=False]",type=str,dest="qsub_depend")
+    add_option("--qsub-backend",default=default_backend,help="Set scheduler backend: pbs (qsub), slurm (sbatch) or local (run on this machine). [default="+default_backend+"]",choices=['pbs','slurm','local'],dest="qsub_backend")
+    add_option("--qsub-outdir",default=False,help="Set the directory for the job stdout and stderr files (PBS -o/-e), e.g. one per sweep. [default=submission directory]",type=str,dest="qsub_outdir")
+    add_option("--qsub-archive",default=False,help="Append submitted pbs scripts to this compressed archive file rather than keeping a pbs file for each job.",type=str,dest="qsub_archive")
+    add_option("--qsub-advisor",default=False,help="Record job resource usage in this SQLite database and set the walltime, pmem and ppn requests from the usage of previous jobs with the same name and module.",type=str,dest="qsub_advisor")
+    add_option("--qsub-cache",default=False,help="Skip jobs with the same script as a job in this SQLite cache that is queued, running or completed successfully.",type=str,dest="qsub_cache")
+    add_option("--qsub-force",default=False,help="Flag to submit jobs even if an identical job is in the cache.",action='store_true',dest="qsub_force")
+    return group
+_formatters={}
+def help_formatter(parser_module):
+    """Returns the help formatter class that keeps new lines in help strings
+
+    The class is only created when it is needed (i.e. when help is requested), to keep the command line start up fast.
+
+    Args
+        parser_module: argparse or optparse module
+
+    Returns
+        IndentedHelpFormatterWithNL: help formatter class for the parser module
+
+    """
+    if parser_module.__name__ in _formatters:
+        return _formatters[parser_module.__name__]
+    import textwrap
+    if parser_module.__name__=='argparse':
+        argparse=parser_module
         class IndentedHelpFormatterWithNL(argparse.RawDescriptionHelpFormatter):
             def _format_action(self, action):
                 # determine the required width and the entry label
@@ -189,19 +571,8 @@ def __run__(inputArgs=[]):
 
                 # return a single string
                 return self._join_parts(parts)
-        parser=argparse.ArgumentParser(prog='pyqsub',description="Submitting a job_string script to the cluster",formatter_class=IndentedHelpFormatterWithNL)
-        parser.add_argument('-j','--job_string','--jobstring','--job-string',type=str,help="job_string to submit to cluster",dest='job_string',default=False)
-        parser.add_argument('-m','--module_name','--modulename','--module-name',type=str,help="module_name to submit to cluster",dest='module_name',default=False)
-        group=parser.add_argument_group('Cluster',description="\nCommands for  submitting to a cluster environment using qsub/PBS")
-        group=parser_group(module_name='pyqsub',group=group) 
-        #For testing
-        if inputArgs:
-            options,unknown=parser.parse_known_args(inputArgs)
-        else:
-            options,unknown=parser.parse_known_args()
-        options=vars(options)
-        options['unknown']=' '.join(unknown)
     else:
+        optparse=parser_module
         class IndentedHelpFormatterWithNL(optparse.IndentedHelpFormatter):
             def format_description(self, description):
                 if not description: return ""
@@ -262,9 +633,44 @@ def __run__(inputArgs=[]):
                 elif opts[-1] != "\n":
                   result.append("\n")
                 return "".join(result)
-        parser=optparse.OptionParser(prog='pyqsub',description=description+argparsedescription,formatter_class=IndentedHelpFormatterWithNL)
+    _formatters[parser_module.__name__]=IndentedHelpFormatterWithNL
+    return IndentedHelpFormatterWithNL
+def __run__(inputArgs=[]):
+    args=inputArgs or sys.argv[1:]
+    if len(args) and args[0]=='serve':
+        try:
+            from .daemon import __run__ as serve
+        except (ImportError,ValueError,SystemError):
+            from daemon import __run__ as serve
+        return serve(args[1:])
+    show_help='-h' in args or '--help' in args
+    if ARGPARSE:
+        import argparse
+        parser=argparse.ArgumentParser(prog='pyqsub',description="Submitting a job_string script to the cluster\n\nRun pyqsub serve -h for help on the submission daemon",formatter_class=help_formatter(argparse) if show_help else argparse.RawDescriptionHelpFormatter)
+        parser.add_argument('-j','--job_string','--jobstring','--job-string',type=str,help="job_string to submit to cluster",dest='job_string',default=False)
+        parser.add_argument('-m','--module_name','--modulename','--module-name',type=str,help="module_name to submit to cluster",dest='module_name',default=False)
+        parser.add_argument('-f','--task_file','--taskfile','--task-file',type=str,help="file of commands (one per line) to submit packed into jobs",dest='task_file',default=False)
+        parser.add_argument('--socket',type=str,help="Submit using the pyqsub daemon listening on this socket (start the daemon using pyqsub serve)",dest='socket',default=False)
+        parser.add_argument('--pack',type=int,help="Pack the commands (the task_file or the lines of the job_string) into this many jobs, each running the commands on ppn processors",dest='qsub_pack',default=0)
+        group=parser.add_argument_group('Cluster',description="\nCommands for  submitting to a cluster environment using qsub/PBS")
+        group=parser_group(module_name='pyqsub',group=group) 
+        #For testing
+        if inputArgs:
+            options,unknown=parser.parse_known_args(inputArgs)
+        else:
+            options,unknown=parser.parse_known_args()
+        options=vars(options)
+        options['unknown']=' '.join(unknown)
+        if options['qsub_pack'] and not options['task_file'] and not options['job_string']:
+            parser.error("--pack requires a task file or job string")
+    else:
+        import optparse
+        parser=optparse.OptionParser(prog='pyqsub',description="Submitting a job_string script to the cluster",formatter=help_formatter(optparse)() if show_help else None)
         parser.add_option('-j','--job_string','--jobstring','--job-string',type=str,help="job_string to submit to cluster",dest='job_string',default=False)
         parser.add_option('-m','--module_name','--modulename','--module-name',type=str,help="module_name to submit to cluster",dest='module_name',default=False)
+        parser.add_option('-f','--task_file','--taskfile','--task-file',type=str,help="file of commands (one per line) to submit packed into jobs",dest='task_file',default=False)
+        parser.add_option('--socket',type=str,help="Submit using the pyqsub daemon listening on this socket (start the daemon using pyqsub serve)",dest='socket',default=False)
+        parser.add_option('--pack',type=int,help="Pack the commands (the task_file or the lines of the job_string) into this many jobs, each running the commands on ppn processors",dest='qsub_pack',default=0)
         group=optparse.OptionGroup(parser,'Cluster',description="\nCommands for submitting to a cluster environment using qsub/PBS")
         group=parser_group(module_name='pyqsub',group=group) 
         parser.add_option_group(group)    
@@ -273,10 +679,25 @@ def __run__(inputArgs=[]):
         else:
             (options,args)=parser.parse_args()
         options=vars(options)
-        if not options['job_string'] and not options['module_name']:
-            parser.error("job string or module name required")
+        if not options['job_string'] and not options['module_name'] and not options['task_file']:
+            parser.error("job string, module name or task file required")
+        if options['qsub_pack'] and not options['task_file'] and not options['job_string']:
+            parser.error("--pack requires a task file or job string")
         options['unknown']=' '.join(args)
     options['qsub']=True
-    submit(options,{'unknown':''},options['module_name'],options['job_string'])
+    if options['task_file'] or options['qsub_pack']:
+        try:
+            from .packing import submit_packed
+        except (ImportError,ValueError,SystemError):
+            from packing import submit_packed
+        submit_packed(options,options['task_file'] or options['job_string'].split('\n'),options['qsub_pack'])
+    elif options['socket']:
+        try:
+            from .daemon import daemon_submit
+        except (ImportError,ValueError,SystemError):
+            from daemon import daemon_submit
+        print ('Submitted job: '+daemon_submit(options,{'unknown':''},options['module_name'],options['job_string'],socket_path=options['socket']))
+    else:
+        submit(options,{'unknown':''},options['module_name'],options['job_string'])
 if __name__=="__main__":
     __run__()
@@ -27,6 +27,14 @@ Using optparse::
 
 Each of the options is prefixed by qsub (e.g. qsub_nodes for the nodes argument).
 
+The job prologue is set by the options too: the job changes to the working directory (--qsub-workdir, default $HOME), loads environment modules
+(--qsub-loadmodule), sets environment variables (--qsub-env NAME=VALUE), runs any prologue commands (--qsub-prologue) and then waits for readiness checks (--qsub-ready)
+to succeed before running. A fixed sleep can be added using --qsub-sleep, but by default the job starts straight away.
+
+Hybrid MPI/OpenMP jobs (with qsub_mpi set in the options) can set the ranks per node (--qsub-ranks) and threads per rank (--qsub-threads). The job exports
+OMP_NUM_THREADS and runs mpirun -n nodes*ranks --map-by ppr:ranks:node:PE=threads, and the mapping and binding can be changed using --qsub-mapby and --qsub-bindto.
+Rendering the script raises a ValueError if ranks x threads is more than ppn.
+
 submit()
 ---------------------------------
 This function requires a dictionary of the options and the dictionary of the mappings of the option names to the command line flags (options_map). The options_map can be easily generated using an argparse parser::
@@ -55,8 +63,142 @@ All flags containing qsub are ignored in constructing the script, but all other
 submit() can take job_string as an argument instead. This is a custom job strings for the pbs script, allowing non-python programs to use the module as a simple wrapper function, or to be otherwise integrated.
 In this case, the options argument needs to contain the qsub options and the options_map argument can be a blank delimiter, while the module_name corresponds to the desired default job_name.
 
+submit() returns the job id returned by qsub.
+
+By default submit() writes a pbs file for each job. Setting the qsub_stdin option (--qsub-stdin) pipes the script to qsub on stdin instead, and setting
+qsub_archive (--qsub-archive) to a file path appends the scripts to a single compressed archive keyed by job id (see pyqsub.archive.Archive) rather than
+leaving a pbs file per job.
+
+The scheduler is chosen using the qsub_backend option (--qsub-backend): pbs (qsub, the default), slurm (sbatch) or local, which runs the jobs on the
+local machine using a process pool with a worker per core, useful for small sweeps and testing without a cluster (see pyqsub.backends).
+
 This aspect of pyqsub can be called from the command line, try pyqsub -h for help.
 
+submit_array()
+---------------------------------
+Large numbers of similar jobs (e.g. parameter sweeps) can be submitted with a single qsub call using submit_array(), which takes a list of options dicts (or
+a list of single line job strings) and submits them as one array job (#PBS -t 0-N)::
+
+    job_ids=qsub.submit_array([dict(options,seed=seed) for seed in range(5000)],options_map,module_name='module_name')
+
+Each job reads its option flags from a task table written to the current directory, so this file needs to be kept until the jobs have run. The qsub
+options (resources, queue etc.) must be the same for all the jobs. A list of job ids is returned, one for each job.
+
+ScriptTemplate
+---------------------------------
+When only a few options change between jobs, a ScriptTemplate can be compiled once from the default options, and then only the changed options are
+formatted for each job::
+
+    template=qsub.ScriptTemplate(options,options_map,module_name='module_name')
+    for seed in range(5000):
+        job_id=template.submit({'seed':seed})
+
+ScriptTemplate.render() returns the script without submitting it. The rendering rate can be compared with make_script() using python -m pyqsub.benchmark
+--template, and python -m pyqsub.benchmark --load --output results.json load tests submit() and the command line against a fake qsub/qstat.
+
+SubmissionPool
+---------------------------------
+Jobs that cannot be submitted as an array can be submitted concurrently using a SubmissionPool, which runs submit() in a number of worker threads and
+returns futures that resolve to the job ids::
+
+    with qsub.SubmissionPool(workers=4) as pool:
+        futures=pool.map(options_list,options_map,module_name='module_name')
+    job_ids=[future.result() for future in futures]
+
+Failed qsub calls are retried with exponential backoff, and SubmissionPool.submit() blocks once max_pending jobs are waiting to be submitted.
+
+Task packing
+---------------------------------
+Many short commands can be packed into a few jobs using pyqsub.packing.submit_packed(), or from the command line using pyqsub -f commands.txt --pack 10.
+Each job runs its share of the commands on a process pool with ppn workers, which take the next command as soon as they are free, and writes the exit
+code, start time and duration of each command to a results file (read using pyqsub.packing.read_results())::
+
+    from pyqsub.packing import submit_packed
+    job_ids,results_files=submit_packed(options,'commands.txt',jobs=10)
+
+Instrumentation
+---------------------------------
+The phases of a submission (make_optstr, render, write, qsub, rename and parse) are timed and passed to any hooks added using pyqsub.metrics.add_hook().
+Events can be exported to a JSON lines file or a Prometheus textfile::
+
+    from pyqsub import metrics
+    metrics.add_hook(metrics.JSONLinesExporter('submit_timings.jsonl'))
+
+Setting the qsub_timestamps option (--qsub-timestamps) makes the job print start and end markers to stderr, which pyqsub.metrics.parse_markers() reads to get
+the queue wait and run time.
+
+Submission daemon
+---------------------------------
+pyqsub serve starts a daemon listening on a Unix socket (--socket, default ~/.pyqsub.sock) for job specs sent as lines of JSON. The daemon keeps the
+parser_group() defaults and batches requests that arrive close together into array jobs. Jobs can be sent using pyqsub --socket path -j ..., or::
+
+    from pyqsub.daemon import daemon_submit
+    job_id=daemon_submit({'seed':1},options_map,module_name='module_name')
+
+Resource advisor
+---------------------------------
+Setting the qsub_advisor option (--qsub-advisor path) records the requested resources of each job in a SQLite database, keyed by job id with the job name
+(qsub_N) and module name. The used resources of completed jobs are collected from qstat -x (at most every 5 minutes) or from the Torque accounting logs,
+and once there are 5 successful jobs with the same name and module, the walltime, pmem and ppn requests are set from the 95th percentile of their usage
+(with a 20% margin), so the jobs fit into backfill windows sooner. Suggestions can also be made without submitting::
+
+    from pyqsub.advisor import ResourceAdvisor
+    advisor=ResourceAdvisor('resources.db')
+    advisor.collect_accounting('/var/spool/torque/server_priv/accounting/20150101')
+    print(advisor.suggest('job_name','module_name'))
+
+Submission cache
+---------------------------------
+Setting the qsub_cache option (--qsub-cache path) stores a hash of each submitted script with its job id in a SQLite database. When a sweep is re-run,
+submit() skips jobs with an identical script that are queued, running or have completed successfully (checked with a single qstat call) and returns
+the earlier job id, so only the failed or missing jobs are resubmitted. Jobs that are no longer listed by qstat have an unknown exit status, so are
+not resubmitted. The qsub_force option (--qsub-force) submits the jobs regardless. The job states are read using qstat, so the cache can only be used
+with the pbs backend. Old jobs are evicted from the cache after 30 days, or once it holds more than 100000 jobs (see pyqsub.cache.SubmissionCache).
+
+Throttled queue
+---------------------------------
+Sweeps that are larger than the scheduler's per user limits can be added to a ThrottledQueue (pyqsub.throttle.ThrottledQueue), which stores the jobs
+in a SQLite database and releases them just fast enough to keep the user's jobs in the scheduler under max_queued, checking the occupancy with one
+qstat -t -u $USER call per step. The queue resumes with the next unsubmitted job after a restart (python -m pyqsub.throttle queue.db --maxqueued 500).
+
+Job output collection
+---------------------------------
+Setting the qsub_outdir option (--qsub-outdir) writes the job stdout and stderr files to a directory (e.g. one per sweep) using #PBS -o/-e (or the
+Slurm --output/--error). An OutputCollector (pyqsub.collector.OutputCollector) moves the files of finished jobs into a single append-only archive
+keyed by job id, and searches it using a memory map rather than opening a file per job::
+
+    collector=OutputCollector('sweep_output')
+    collector.stream(job_ids)
+    errors=list(collector.grep('Traceback'))
+
+JobTracker
+---------------------------------
+The states of submitted jobs can be followed using a JobTracker (pyqsub.tracker.JobTracker), which refreshes the state of all the tracked jobs with
+a single qstat -x call, caching the states for ttl seconds::
+
+    from pyqsub.tracker import JobTracker
+    tracker=JobTracker(ttl=30)
+    job_ids=tracker.submit_array(options_list,options_map,module_name='module_name')
+    for job_id in tracker.as_completed(job_ids):
+        print(job_id,tracker.exit_status(job_id))
+
+JobTracker.wait() blocks until the jobs have finished or the timeout is reached.
+
+Workflow
+---------------------------------
+Multi-stage pipelines can be submitted as a Workflow (pyqsub.workflow.Workflow), with each job depending on the jobs that must finish before it::
+
+    from pyqsub.workflow import Workflow
+    workflow=Workflow()
+    pre=workflow.add(pre_options,options_map,module_name='module_name')
+    fan=workflow.add_array(sweep_options,options_map,module_name='module_name',after=[pre])
+    workflow.add(reduce_options,options_map,module_name='module_name',after=[fan])
+    job_ids=workflow.submit()
+
+The jobs are submitted in topological order with #PBS -W depend=afterok (afterokarray for array jobs) dependencies, so the scheduler handles the
+ordering. Wide fan-ins are split using aggregator jobs so no dependency list is longer than max_dependencies. Dependencies can also be set
+directly using the qsub_depend option (--qsub-depend).
+
 -------------------------------------------
 
 Copyright (c) 2015 David J Pugh
@@ -73,6 +215,11 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OU
 IN THE SOFTWARE.
 
 """
-from __core__ import __run__,parser_group,submit
+try:
+    from .__core__ import __run__,parser_group,submit,submit_array,make_script,make_optstr,QsubError,ScriptTemplate
+    from .pool import SubmissionPool
+except (ImportError,ValueError,SystemError):
+    from __core__ import __run__,parser_group,submit,submit_array,make_script,make_optstr,QsubError,ScriptTemplate
+    from pool import SubmissionPool
 if __name__=="__main__":
     __run__()
\ No newline at end of file
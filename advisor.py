@@ -0,0 +1,208 @@
+"""advisor
+******************
+
+Resource right-sizing for pyqsub.
+
+The requested and used resources of jobs are recorded in a SQLite database, keyed by job id with the job name (qsub_N) and module name.
+The used resources are collected from qstat -x (completed jobs are kept by Torque for keep_completed seconds) or from the Torque accounting
+logs. Percentile based walltime, pmem and ppn requests are then suggested for new jobs with the same name and module, and applied automatically
+by submit() if the qsub_advisor option (--qsub-advisor) is set to the database path.
+
+-------------------------------------------
+
+Copyright (c) 2015 David J Pugh
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
+import math,sqlite3,threading,time
+try:
+    from .tracker import iter_qstat,short_id
+except (ImportError,ValueError,SystemError):
+    from tracker import iter_qstat,short_id
+MEMORY_UNITS={'b':1./1024**3,'w':8./1024**3,'kb':1./1024**2,'kw':8./1024**2,'mb':1./1024,'mw':8./1024,'gb':1.,'gw':8.,'tb':1024.,'tw':8192.}
+def parse_walltime(walltime):
+    """Converts a walltime of the form [[HH:]MM:]SS to seconds"""
+    seconds=0.
+    for part in str(walltime).split(':'):
+        seconds=seconds*60+float(part)
+    return seconds
+def format_walltime(seconds):
+    """Converts seconds to a walltime of the form HH:MM:SS"""
+    seconds=int(math.ceil(seconds))
+    return '%02d:%02d:%02d'%(seconds//3600,(seconds%3600)//60,seconds%60)
+def parse_memory(memory):
+    """Converts a Torque memory size (e.g. 1024kb) to Gb"""
+    memory=str(memory).strip().lower()
+    number=memory.rstrip('bkmgtw')
+    return float(number)*MEMORY_UNITS.get(memory[len(number):] or 'b',1./1024**3)
+def percentile(values,q):
+    """Returns the q-th percentile (nearest rank) of a list of values"""
+    values=sorted(values)
+    return values[max(int(math.ceil(q/100.*len(values)))-1,0)]
+class ResourceAdvisor(object):
+    """Records job resource usage and suggests resource requests
+
+    Args
+        path: str SQLite database path
+        collect_interval: float minimum time in seconds between automatic qstat collections [default=300]
+
+    """
+    def __init__(self,path,collect_interval=300.):
+        self.path=path
+        self.collect_interval=collect_interval
+        self._lock=threading.RLock()#the connection is shared by the SubmissionPool threads
+        self._connection=sqlite3.connect(path,timeout=30,check_same_thread=False)
+        with self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, name TEXT, module TEXT, submitted REAL, '
+                                     'nodes INTEGER, ppn INTEGER, walltime REAL, pmem REAL, '
+                                     'used_walltime REAL, used_mem REAL, used_cput REAL, exit_status INTEGER)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS jobs_name ON jobs (name, module)')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL)')
+    def close(self):
+        """Closes the database"""
+        self._connection.close()
+    def submitted(self,job_id,options,module_name=False):
+        """Records the requested resources of a submitted job
+
+        Args
+            job_id: str job id
+            options: dict of options and values
+            module_name: str module name for job [default=False]
+
+        """
+        with self._lock,self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO jobs (job_id, name, module, submitted, nodes, ppn, walltime, pmem) VALUES (?,?,?,?,?,?,?,?)',
+                                     (short_id(job_id),str(options['qsub_N']),module_name or '',time.time(),int(options['qsub_nodes']),
+                                      int(options['qsub_ppn']),parse_walltime(options['qsub_walltime']),float(options['qsub_pmem'] or 0)))
+    def record(self,job_id,used_walltime,used_mem,used_cput,exit_status):
+        """Records the used resources of a finished job
+
+        Args
+            job_id: str job id
+            used_walltime: float used walltime in seconds
+            used_mem: float used memory in Gb
+            used_cput: float used cpu time in seconds (None if not known)
+            exit_status: int job exit status
+
+        """
+        with self._lock,self._connection:
+            self._connection.execute('UPDATE jobs SET used_walltime=?, used_mem=?, used_cput=?, exit_status=? WHERE job_id=?',
+                                     (used_walltime,used_mem,used_cput,exit_status,short_id(job_id)))
+    def _record_job(self,job,pending):
+        job_id=short_id(job.get('Job_Id'))
+        if job_id not in pending or job.get('resources_used.walltime') is None or job.get('exit_status') is None:
+            return False
+        self.record(job_id,parse_walltime(job['resources_used.walltime']),parse_memory(job.get('resources_used.mem') or 0),
+                    parse_walltime(job['resources_used.cput']) if job.get('resources_used.cput') else None,int(job['exit_status']))
+        return True
+    def _pending(self):
+        with self._lock:
+            return set(row[0] for row in self._connection.execute('SELECT job_id FROM jobs WHERE used_walltime IS NULL'))
+    def collect(self,qstat=['qstat','-x','-t']):
+        """Collects the used resources of completed jobs from qstat (one call for all jobs)
+
+        Args
+            qstat: list qstat command (must return XML) [default=['qstat','-x','-t']]
+
+        Returns
+            n: int number of jobs recorded
+
+        """
+        pending=self._pending()
+        n=0
+        if pending:
+            for job in iter_qstat(qstat):
+                if job.get('job_state')=='C':
+                    n+=self._record_job(job,pending)
+        with self._lock,self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?,?)',('last_collect',time.time()))
+        return n
+    def collect_accounting(self,path):
+        """Collects the used resources of completed jobs from a Torque accounting log file
+
+        Args
+            path: str accounting log file path (e.g. /var/spool/torque/server_priv/accounting/20150101)
+
+        Returns
+            n: int number of jobs recorded
+
+        """
+        pending=self._pending()
+        n=0
+        with open(path) as f:
+            for line in f:
+                fields=line.rstrip('\n').split(';',3)
+                if len(fields)<4 or fields[1]!='E':
+                    continue
+                job=dict(attribute.split('=',1) for attribute in fields[3].split() if '=' in attribute)
+                job['Job_Id']=fields[2]
+                job['exit_status']=job.get('Exit_status')
+                n+=self._record_job(job,pending)
+        return n
+    def suggest(self,name,module_name=False,percentile_q=95,margin=1.2,min_jobs=5):
+        """Suggests resource requests from the recorded successful jobs with the same name and module
+
+        The walltime and pmem suggestions are the percentile_q percentile of the used walltime and memory per processor multiplied by margin.
+        The ppn suggestion is the percentile_q percentile of the number of cores used (cpu time/walltime per node) multiplied by margin, and
+        is never more than the ppn requested. It is only made if the cpu time is known for all the jobs.
+
+        Args
+            name: str job name (qsub_N)
+            module_name: str module name for job [default=False]
+            percentile_q: float percentile to use [default=95]
+            margin: float safety factor applied to the percentiles [default=1.2]
+            min_jobs: int minimum number of recorded jobs needed for a suggestion [default=5]
+
+        Returns
+            suggestion: dict of qsub_walltime, qsub_pmem and qsub_ppn values (empty if there are fewer than min_jobs recorded jobs)
+
+        """
+        with self._lock:
+            rows=list(self._connection.execute('SELECT nodes, ppn, used_walltime, used_mem, used_cput FROM jobs WHERE name=? AND module=? '
+                                               'AND exit_status=0 AND used_walltime>0',(str(name),module_name or '')))
+        if len(rows)<min_jobs:
+            return {}
+        walltime=percentile([row[2] for row in rows],percentile_q)*margin
+        pmem=percentile([row[3]/(row[0]*row[1]) for row in rows],percentile_q)*margin
+        suggestion={'qsub_walltime':format_walltime(max(walltime,60)),'qsub_pmem':float(max(int(math.ceil(pmem)),1))}
+        if all(row[4] is not None for row in rows):
+            cores=percentile([row[4]/row[2]/row[0] for row in rows],percentile_q)*margin
+            suggestion['qsub_ppn']=int(min(max(int(math.ceil(cores)),1),max(row[1] for row in rows)))
+        return suggestion
+    def apply(self,options,module_name=False,**kwargs):
+        """Applies the suggested resource requests to the options
+
+        The used resources are collected from qstat first if they have not been collected for collect_interval seconds. The ppn is not changed
+        for MPI jobs (qsub_mpi, qsub_threads or qsub_ranks_per_node set).
+
+        Args
+            options: dict of options and values
+            module_name: str module name for job [default=False]
+            kwargs: keyword arguments for ResourceAdvisor.suggest()
+
+        Returns
+            options: dict of options and values with the suggested resource requests
+
+        """
+        with self._lock:
+            last_collect=self._connection.execute('SELECT value FROM meta WHERE key=?',('last_collect',)).fetchone()
+        if last_collect is None or time.time()-last_collect[0]>self.collect_interval:
+            try:
+                self.collect()
+            except (OSError,RuntimeError):
+                pass#qstat not available, use the recorded jobs
+        suggestion=self.suggest(options['qsub_N'],module_name,**kwargs)
+        if options.get('qsub_mpi',False) or options.get('qsub_threads') or options.get('qsub_ranks_per_node'):
+            suggestion.pop('qsub_ppn',None)#The ppn sets the MPI rank count and layout, so changing it would change what the job runs
+        if suggestion:
+            options=dict(options,**suggestion)
+        return options
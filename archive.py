@@ -0,0 +1,158 @@
+"""archive
+******************
+
+Append-only indexed archive for pyqsub.
+
+The archive is a data file of (optionally zlib compressed) records and a plain text index file (path.idx) with one tab separated line
+per record giving the key, offset and length of the record in the data file. Records are only ever appended, so many processes can
+append to the same archive (appends are locked using fcntl where available).
+
+-------------------------------------------
+
+Copyright (c) 2015 David J Pugh
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
+import os,re,threading,zlib
+try:
+    import fcntl
+    FCNTL=True
+except:
+    FCNTL=False
+class Archive(object):
+    """Append-only archive of records indexed by key (e.g. pbs scripts by job id)
+
+    Args
+        path: str archive data file path (the index is written to path.idx)
+        compress: bool compress records using zlib [default=True]
+
+    """
+    _lock=threading.Lock()
+    def __init__(self,path,compress=True):
+        self.path=path
+        self.index_path=path+'.idx'
+        self.compress=compress
+    def append(self,key,data):
+        """Appends a record to the archive
+
+        Args
+            key: str record key
+            data: str or bytes record data
+
+        """
+        if not isinstance(data,bytes):
+            data=data.encode('utf-8')
+        if self.compress:
+            data=zlib.compress(data)
+        with self._lock:
+            with open(self.path,'ab') as f:
+                if FCNTL:
+                    fcntl.flock(f,fcntl.LOCK_EX)
+                try:
+                    f.seek(0,os.SEEK_END)
+                    offset=f.tell()
+                    f.write(data)
+                    f.flush()
+                    with open(self.index_path,'a') as index:
+                        index.write(str(key)+'\t'+str(offset)+'\t'+str(len(data))+'\n')
+                finally:
+                    if FCNTL:
+                        fcntl.flock(f,fcntl.LOCK_UN)
+    def index(self):
+        """Reads the archive index
+
+        Returns
+            index: dict mapping keys to (offset,length) tuples (the last record is used for repeated keys)
+
+        """
+        index={}
+        if not os.path.exists(self.index_path):
+            return index
+        with open(self.index_path) as f:
+            for line in f:
+                key,offset,length=line.rstrip('\n').rsplit('\t',2)
+                index[key]=(int(offset),int(length))
+        return index
+    def keys(self):
+        """Returns the archive keys"""
+        return list(self.index().keys())
+    def get(self,key):
+        """Reads a record from the archive
+
+        Args
+            key: str record key
+
+        Returns
+            data: str record data
+
+        """
+        offset,length=self.index()[str(key)]
+        with open(self.path,'rb') as f:
+            f.seek(offset)
+            return self._decode(f.read(length))
+    def __iter__(self):
+        """Iterates over (key,data) tuples in the archive"""
+        with open(self.path,'rb') as f:
+            for key,(offset,length) in sorted(self.index().items(),key=lambda item:item[1][0]):
+                f.seek(offset)
+                yield key,self._decode(f.read(length))
+    def grep(self,pattern,flags=0):
+        """Searches the records for lines matching a regular expression
+
+        Uncompressed archives are searched using a memory map of the data file, so large archives of small records (e.g. job outputs)
+        are searched without a read call for each record. Compressed records are decompressed and searched one at a time.
+
+        Args
+            pattern: str regular expression
+            flags: int re flags [default=0]
+
+        Returns
+            matches: generator of (key,line) tuples in archive order
+
+        """
+        records=sorted((offset,length,key) for key,(offset,length) in self.index().items())
+        if not records:
+            return
+        if self.compress:
+            regex=re.compile(pattern,flags)
+            with open(self.path,'rb') as f:
+                for offset,length,key in records:
+                    f.seek(offset)
+                    for line in self._decode(f.read(length)).splitlines():
+                        if regex.search(line):
+                            yield key,line
+            return
+        if not os.path.getsize(self.path):
+            return#Only empty records, which cannot be memory mapped
+        import mmap
+        regex=re.compile(pattern.encode('utf-8'),flags|re.MULTILINE)#^ and $ match at the line ends, as for the compressed records
+        with open(self.path,'rb') as f:
+            data=mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+            try:
+                for offset,length,key in records:
+                    #Each record is searched separately so matches cannot run on into the next record
+                    record=data[offset:offset+length]
+                    line_end=-1
+                    for match in regex.finditer(record):
+                        if match.start()<line_end:
+                            continue#Already matched this line
+                        line_start=record.rfind(b'\n',0,match.start())+1
+                        line_end=record.find(b'\n',match.end())
+                        if line_end<0:
+                            line_end=len(record)
+                        yield key,record[line_start:line_end].decode('utf-8','replace')
+            finally:
+                data.close()
+    def _decode(self,data):
+        if self.compress:
+            data=zlib.decompress(data)
+        return data.decode('utf-8')
@@ -0,0 +1,377 @@
+"""backends
+******************
+
+Scheduler backends for pyqsub.
+
+A backend renders the scheduler directives for the qsub options from parser_group() and submits the job script. The backend is
+selected using the qsub_backend option (--qsub-backend):
+
+    * pbs - PBS/Torque using qsub (default)
+    * slurm - Slurm using sbatch
+    * local - runs the jobs on the local machine using a process pool, one worker per core
+
+-------------------------------------------
+
+Copyright (c) 2015 David J Pugh
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
+import os
+try:
+    from .metrics import timed
+except (ImportError,ValueError,SystemError):
+    from metrics import timed
+class QsubError(RuntimeError):
+    """Error raised when qsub fails to submit a job"""
+def mpi_layout(options):
+    """Returns the hybrid MPI/OpenMP layout from the qsub options
+
+    The threads per rank (qsub_threads) defaults to 1 and the ranks per node (qsub_ranks_per_node) to qsub_ppn/qsub_threads. The total number
+    of ranks is qsub_np if set, otherwise qsub_nodes*ranks per node.
+
+    Args
+        options: dict of options and values
+
+    Returns
+        np,ranks_per_node,threads: int total number of ranks, ranks per node and threads per rank
+
+    Raises
+        ValueError: if the ranks per node and threads per rank do not fit in qsub_ppn
+
+    """
+    threads=int(options.get('qsub_threads') or 1)
+    ranks_per_node=int(options.get('qsub_ranks_per_node') or options['qsub_ppn']//threads)
+    if threads<1 or ranks_per_node<1 or ranks_per_node*threads>options['qsub_ppn']:
+        raise ValueError(str(ranks_per_node)+" ranks per node with "+str(threads)+" threads per rank does not fit in ppn="+str(options['qsub_ppn'])+".")
+    return int(options.get('qsub_np',options['qsub_nodes']*ranks_per_node)),ranks_per_node,threads
+def output_dir(options):
+    """Returns the absolute path of the job output directory (qsub_outdir), creating it if needed
+
+    Args
+        options: dict of options and values
+
+    Returns
+        outdir: str output directory path
+
+    """
+    outdir=os.path.abspath(os.path.expanduser(os.path.expandvars(options['qsub_outdir'])))
+    if not os.path.isdir(outdir):
+        try:
+            os.makedirs(outdir)
+        except OSError:
+            if not os.path.isdir(outdir):#Created by another process
+                raise
+    return outdir
+class Backend(object):
+    """Base class for scheduler backends
+
+    Subclasses set the submission command and the array index variable and implement directives().
+
+    """
+    name=''
+    command=[]
+    array_index='$PYQSUB_ARRAYID'
+    def directives(self,options):
+        """Renders the scheduler directives for the qsub options
+
+        Args
+            options: dict of options and values
+
+        Returns
+            directives: str scheduler directive lines
+
+        """
+        return ''
+    def parse_job_id(self,out):
+        """Returns the job id from the submission command output"""
+        return out.strip()
+    def array_ids(self,job_id,n):
+        """Returns the ids of the jobs in an array job
+
+        Args
+            job_id: str array job id returned by the submission command (e.g. 123[].server)
+            n: int number of jobs in the array
+
+        Returns
+            job_ids: list of job ids (e.g. 123[0].server)
+
+        """
+        if '[]' in job_id:
+            prefix,suffix=job_id.split('[]',1)
+        else:
+            prefix,suffix=job_id.split('.')[0],job_id[len(job_id.split('.')[0]):]
+        return [prefix+'['+str(i)+']'+suffix for i in range(n)]
+    def array_id(self,job_ids):
+        """Returns the array job id from the ids of the jobs in the array (e.g. 123[].server for 123[0].server)"""
+        import re
+        return re.sub(r'\[\d+\]','[]',job_ids[0],count=1)
+    def depend(self,job_ids=[],array_ids=[]):
+        """Renders a dependency on jobs finishing successfully
+
+        Args
+            job_ids: list of job ids
+            array_ids: list of array job ids (from Backend.array_id())
+
+        Returns
+            depend: str dependency string for the qsub_depend option
+
+        """
+        return 'afterok:'+':'.join(list(job_ids)+list(array_ids))
+    def submit_script(self,qsub_script,name,stdin=False,archive=False,array=None):
+        """Submits a job script
+
+        By default the script is written to a file, which is renamed according to the job name and job id after submission.
+        If stdin is set, the script is piped to the submission command on stdin without writing a file. If archive is set, the script
+        is appended to the archive (see pyqsub.archive.Archive) keyed by the job id, rather than keeping a file for each job.
+
+        Args:
+            qsub_script: str job script
+            name: str job name
+            stdin: bool pipe the script to the submission command on stdin [default=False]
+            archive: str archive file path or pyqsub.archive.Archive object [default=False]
+            array: int number of jobs if the script is an array job [default=None]
+
+        Returns
+            job_id: str job id returned by the submission command
+
+        """
+        import subprocess
+        if stdin:
+            with timed('qsub',name=name):
+                process=subprocess.Popen(self.command,stdin=subprocess.PIPE,stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
+                out,err=process.communicate(qsub_script)
+            temp_file=False
+        else:
+            import stat,tempfile
+            with timed('write',name=name):
+                fd,temp_file=tempfile.mkstemp(prefix=name+'_',suffix='_temp.pbs',dir=os.getcwd())
+                with os.fdopen(fd,'w') as f:
+                    f.write(qsub_script)
+                os.chmod(temp_file, stat.S_IRWXO| stat.S_IRWXG|stat.S_IRWXU)
+            with timed('qsub',name=name):
+                process=subprocess.Popen(self.command+[temp_file],stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
+                out,err=process.communicate()
+        if process.returncode:
+            if temp_file:
+                os.remove(temp_file)
+            raise QsubError(self.command[0]+' failed for '+name+': '+err.strip())
+        print ('\n===============\nSubmitted job: '+out)
+        with timed('parse',name=name):
+            job_id=self.parse_job_id(out)
+        if archive:
+            with timed('write',name=name):
+                self.archive(archive,job_id,qsub_script)
+                if temp_file:
+                    os.remove(temp_file)
+        elif temp_file:
+            with timed('rename',name=name):
+                os.rename(temp_file,name+'.p'+job_id.split('.')[0])
+        return job_id
+    def archive(self,archive,job_id,qsub_script):
+        """Appends a job script to an archive
+
+        Args
+            archive: str archive file path or pyqsub.archive.Archive object
+            job_id: str job id
+            qsub_script: str job script
+
+        """
+        if not hasattr(archive,'append'):
+            try:
+                from .archive import Archive
+            except (ImportError,ValueError,SystemError):
+                from archive import Archive
+            archive=Archive(archive)
+        archive.append(job_id,qsub_script)
+class PBSBackend(Backend):
+    """PBS/Torque backend using qsub"""
+    name='pbs'
+    command=['qsub']
+    array_index='$PBS_ARRAYID'
+    def directives(self,options):
+        qsub_script="#PBS -S /bin/sh\n#PBS -N "+str(options['qsub_N'])+"\n#PBS -l walltime="+str(options['qsub_walltime'])+'\n'
+        qsub_script+='#PBS -V\n'
+        qsub_script+='#PBS -l nodes='+str(options['qsub_nodes'])+':ppn='+str(options['qsub_ppn'])
+        if options['qsub_blade_properties']:
+            qsub_script+=':'+options['qsub_blade_properties']
+        if options['qsub_blade_feature']:
+            qsub_script+=',feature='+options['qsub_blade_feature']
+        qsub_script+='\n'
+        if options['qsub_pmem']:
+            qsub_script+='#PBS -l pmem='+str(int(options['qsub_pmem']))+'Gb\n'
+        qsub_script+='#PBS -q '+options['qsub_q']+'\n'
+        if options['qsub_M']:
+            qsub_script+='#PBS -M '+options['qsub_M']+'\n#PBS -m '+options['qsub_m']+'\n'
+        if options.get('qsub_t',False):
+            qsub_script+='#PBS -t '+options['qsub_t']+'\n'
+        if options.get('qsub_depend',False):
+            qsub_script+='#PBS -W depend='+options['qsub_depend']+'\n'
+        if options.get('qsub_outdir',False):
+            outdir=output_dir(options)
+            qsub_script+='#PBS -o '+outdir+'/\n#PBS -e '+outdir+'/\n'
+        return qsub_script
+    def depend(self,job_ids=[],array_ids=[]):
+        depend=[]
+        if len(job_ids):
+            depend.append('afterok:'+':'.join(job_ids))
+        if len(array_ids):
+            depend.append('afterokarray:'+':'.join(array_ids))
+        return ','.join(depend)
+class SlurmBackend(Backend):
+    """Slurm backend using sbatch
+
+    The PBS queue is used as the partition (unless it is auto), the blade properties and feature as constraints and pmem as --mem-per-cpu.
+    The output directory is used for --output and --error, with the PBS style file names name.o<id> and name.e<id>.
+    For hybrid MPI/OpenMP jobs the ranks per node and threads per rank are used as --ntasks-per-node and --cpus-per-task.
+
+    """
+    name='slurm'
+    command=['sbatch','--parsable']
+    array_index='$SLURM_ARRAY_TASK_ID'
+    mail_types={'b':'BEGIN','e':'END','a':'FAIL','n':'NONE'}
+    def directives(self,options):
+        qsub_script='#SBATCH --job-name='+str(options['qsub_N'])+'\n#SBATCH --time='+str(options['qsub_walltime'])+'\n'
+        qsub_script+='#SBATCH --export=ALL\n'
+        if options.get('qsub_ranks_per_node') or options.get('qsub_threads'):
+            np,ranks_per_node,threads=mpi_layout(options)
+            qsub_script+='#SBATCH --nodes='+str(options['qsub_nodes'])+'\n#SBATCH --ntasks-per-node='+str(ranks_per_node)+'\n'
+            qsub_script+='#SBATCH --cpus-per-task='+str(threads)+'\n'
+        else:
+            qsub_script+='#SBATCH --nodes='+str(options['qsub_nodes'])+'\n#SBATCH --ntasks-per-node='+str(options['qsub_ppn'])+'\n'
+        constraints=[constraint for constraint in (options['qsub_blade_properties'],options['qsub_blade_feature']) if constraint]
+        if constraints:
+            qsub_script+='#SBATCH --constraint='+'&'.join(constraints)+'\n'
+        if options['qsub_pmem']:
+            qsub_script+='#SBATCH --mem-per-cpu='+str(int(options['qsub_pmem']))+'G\n'
+        if options['qsub_q'] and options['qsub_q']!='auto':
+            qsub_script+='#SBATCH --partition='+options['qsub_q']+'\n'
+        if options['qsub_M']:
+            mail_types=[self.mail_types[char] for char in options['qsub_m'] if char in self.mail_types]
+            qsub_script+='#SBATCH --mail-user='+options['qsub_M']+'\n#SBATCH --mail-type='+(','.join(mail_types) or 'NONE')+'\n'
+        if options.get('qsub_t',False):
+            qsub_script+='#SBATCH --array='+options['qsub_t']+'\n'
+        if options.get('qsub_depend',False):
+            qsub_script+='#SBATCH --dependency='+options['qsub_depend']+'\n'
+        if options.get('qsub_outdir',False):
+            job_id='%A_%a' if options.get('qsub_t',False) else '%j'
+            outdir=output_dir(options)
+            qsub_script+='#SBATCH --output='+outdir+'/%x.o'+job_id+'\n#SBATCH --error='+outdir+'/%x.e'+job_id+'\n'
+        return qsub_script
+    def parse_job_id(self,out):
+        return out.strip().split(';')[0]
+    def array_ids(self,job_id,n):
+        return [job_id+'_'+str(i) for i in range(n)]
+    def array_id(self,job_ids):
+        return job_ids[0].rsplit('_',1)[0]
+def _run_local(qsub_script,out_file,err_file,env):
+    import subprocess
+    with open(out_file,'w') as out:
+        with open(err_file,'w') as err:
+            return subprocess.call(['/bin/bash','-c',qsub_script],stdout=out,stderr=err,env=env)
+class LocalBackend(Backend):
+    """Local backend running jobs on a process pool
+
+    Jobs are run using bash on a concurrent.futures.ProcessPoolExecutor with one worker per core (by default), with the output written to
+    name.o<id> and name.e<id> in the submission directory (or the qsub_outdir directory). The job id is of the form <n>.local, and the exit code of a job can be got using
+    LocalBackend.result(job_id). Array jobs are run with $PYQSUB_ARRAYID set for each job.
+
+    Requires concurrent.futures (the futures package on python 2).
+
+    Args
+        workers: int number of worker processes [default=number of cores]
+
+    """
+    name='local'
+    def directives(self,options):
+        if options.get('qsub_outdir',False):
+            return '#PYQSUB -o '+output_dir(options)+'\n'
+        return ''
+    def __init__(self,workers=None):
+        import multiprocessing,threading
+        self.workers=workers or multiprocessing.cpu_count()
+        self.futures={}
+        self._executor=None
+        self._counter=0
+        self._lock=threading.Lock()
+    def submit_script(self,qsub_script,name,stdin=False,archive=False,array=None):
+        if self._executor is None:
+            try:
+                from concurrent.futures import ProcessPoolExecutor
+            except ImportError:
+                raise ImportError("LocalBackend requires concurrent.futures (pip install futures for python 2).")
+            self._executor=ProcessPoolExecutor(max_workers=self.workers)
+        with self._lock:
+            self._counter+=1
+            job_id=str(self._counter)+('[]' if array is not None else '')+'.local'
+        if archive:
+            self.archive(archive,job_id,qsub_script)
+        if array is None:
+            self._submit(qsub_script,name,job_id,{})
+        else:
+            for job_id_i,i in zip(self.array_ids(job_id,array),range(array)):
+                self._submit(qsub_script,name,job_id_i,{'PYQSUB_ARRAYID':str(i)})
+        print ('\n===============\nSubmitted job: '+job_id)
+        return job_id
+    def _submit(self,qsub_script,name,job_id,env):
+        env=dict(os.environ,PYQSUB_JOBID=job_id,**env)
+        short_id=job_id.split('.')[0]
+        outdir=os.getcwd()
+        for line in qsub_script.splitlines():
+            if line.startswith('#PYQSUB -o '):
+                outdir=line[len('#PYQSUB -o '):]
+        out_file=os.path.join(outdir,name+'.o'+short_id)
+        err_file=os.path.join(outdir,name+'.e'+short_id)
+        self.futures[job_id]=self._executor.submit(_run_local,qsub_script,out_file,err_file,env)
+    def result(self,job_id,timeout=None):
+        """Waits for a job to finish and returns its exit code
+
+        Args
+            job_id: str job id
+            timeout: float maximum time in seconds to wait [default=None]
+
+        Returns
+            exit_code: int exit code of the job
+
+        """
+        return self.futures[job_id].result(timeout)
+    def shutdown(self,wait=True):
+        """Shuts down the process pool
+
+        Args
+            wait: bool wait for running jobs to finish [default=True]
+
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor=None
+BACKENDS={'pbs':PBSBackend,'slurm':SlurmBackend,'local':LocalBackend}
+_backends={}
+def get_backend(backend='pbs'):
+    """Returns a backend
+
+    Backends are created once and shared, so that e.g. the LocalBackend process pool is reused between submissions.
+
+    Args
+        backend: str backend name (pbs, slurm or local) or Backend object [default=pbs]
+
+    Returns
+        backend: Backend object
+
+    """
+    if isinstance(backend,Backend):
+        return backend
+    if backend not in _backends:
+        try:
+            _backends[backend]=BACKENDS[backend]()
+        except KeyError:
+            raise ValueError("Unknown backend "+str(backend)+", must be one of "+', '.join(sorted(BACKENDS)))
+    return _backends[backend]
@@ -0,0 +1,313 @@
+"""benchmark
+******************
+
+Benchmarks for pyqsub.
+
+Run from the command line using::
+
+    python -m pyqsub.benchmark [--template] [--startup] [--budget seconds] [--load] [--output results.json]
+
+The start up benchmark exits with a non-zero exit code if the package import time is over the budget, so it can be used as a regression check.
+
+The load test runs make_optstr(), submit() and the command line __run__() for 1, 100, 10k and 100k jobs against a fake qsub and qstat (with
+configurable latency, failure rate and job id format) in a temporary directory, and reports the throughput, p50/p99 latency, failures, files
+created and peak memory. The results can be saved as JSON to compare between versions. Each submission starts the fake qsub, so the larger
+sizes take several minutes (use --sizes to limit them).
+
+-------------------------------------------
+
+Copyright (c) 2015 David J Pugh
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
+import os,sys,subprocess,time,timeit
+try:
+    from .__core__ import make_script,make_optstr,submit,ScriptTemplate,QsubError,__run__ as cli
+except (ImportError,ValueError,SystemError):
+    from __core__ import make_script,make_optstr,submit,ScriptTemplate,QsubError,__run__ as cli
+def default_options(n_options=20):
+    """Makes a set of default options and an options_map for benchmarking
+
+    Args
+        n_options: int number of (non qsub) options [default=20]
+
+    Returns
+        options,options_map: dict of options and values, dict mapping options to flags
+
+    """
+    options=dict(qsub=True,qsub_N='bench',qsub_walltime='24:00:00',qsub_nodes=1,qsub_ppn=8,qsub_pmem=1.,qsub_q='auto',qsub_M=False,qsub_m='bae',
+                 qsub_blade_properties=False,qsub_blade_feature=False)
+    options_map={}
+    for i in range(n_options):
+        key='option_'+str(i)
+        if i%4==0:
+            options[key]=[str(i),'x']
+        elif i%4==1:
+            options[key]=True
+        else:
+            options[key]=float(i)
+        options_map[key]='--option'+str(i)
+    return options,options_map
+def template_benchmark(n=10000,n_options=20,varied=2):
+    """Compares the rate of rendering scripts using make_script() and ScriptTemplate.render()
+
+    Args
+        n: int number of scripts to render [default=10000]
+        n_options: int number of (non qsub) options [default=20]
+        varied: int number of options that change between jobs [default=2]
+
+    Returns
+        results: dict of scripts rendered per second for each path
+
+    """
+    options,options_map=default_options(n_options)
+    varied_keys=['option_'+str(i) for i in range(1,varied+1)]
+    jobs=[dict((key,float(j)) for key in varied_keys) for j in range(n)]
+    template=ScriptTemplate(options,options_map,'bench_module')
+    for job in jobs[:10]:
+        assert template.render(job)==make_script(dict(options,**job),options_map,'bench_module')
+    make_script_time=timeit.timeit(lambda:[make_script(dict(options,**job),options_map,'bench_module') for job in jobs],number=1)
+    template_time=timeit.timeit(lambda:[template.render(job) for job in jobs],number=1)
+    return {'make_script':n/make_script_time,'ScriptTemplate':n/template_time}
+STARTUP_BUDGET=0.03
+def _package():
+    """Returns the module to import for the package and the path it is imported from"""
+    package_dir=os.path.dirname(os.path.abspath(__file__))
+    #__name__ is __main__ when run using python -m pyqsub.benchmark, so the package is taken from __package__
+    package=__package__ or __name__.rpartition('.')[0]
+    if package:
+        return package,os.path.dirname(package_dir)
+    return '__core__',package_dir
+def startup_benchmark(repeat=5,budget=STARTUP_BUDGET):
+    """Measures the command line cold start
+
+    Each measurement starts a new interpreter. The import time is the cumulative import time of the package reported by python -X importtime
+    (python 3.7+), and the cli time is the wall time to run pyqsub -h less the wall time to start the interpreter. The best of repeat runs is used.
+
+    Args
+        repeat: int number of runs [default=5]
+        budget: float import time budget in seconds [default=STARTUP_BUDGET]
+
+    Returns
+        results: dict of import time (s), cli time (s), interpreter start time (s), budget and within_budget
+
+    """
+    package,path=_package()
+    env=dict(os.environ,PYTHONPATH=path+os.pathsep+os.environ.get('PYTHONPATH',''))
+    def wall_time(code):
+        start=time.time()
+        subprocess.check_call([sys.executable,'-c',code],env=env,stdout=subprocess.PIPE)
+        return time.time()-start
+    import_times=[]
+    cli_times=[]
+    interpreter_times=[]
+    for i in range(repeat):
+        if sys.version_info[:2]>=(3,7):
+            process=subprocess.Popen([sys.executable,'-X','importtime','-c','import '+package],env=env,stderr=subprocess.PIPE,universal_newlines=True)
+            err=process.communicate()[1]
+            for line in err.splitlines():
+                fields=[field.strip() for field in line.split(':',1)[-1].split('|')]
+                if len(fields)==3 and fields[2]==package:
+                    import_times.append(int(fields[1])/1e6)
+        interpreter_times.append(wall_time('pass'))
+        cli_times.append(wall_time('import '+package+'; '+package+'.__run__(["-h"])')-interpreter_times[-1])
+    import_time=min(import_times) if import_times else None
+    return {'import':import_time,'cli':min(cli_times),'interpreter':min(interpreter_times),'budget':budget,
+            'within_budget':import_time is None or import_time<=budget}
+FAKE_QSUB="""#!/bin/sh
+# pyqsub benchmark fake qsub: configured by PYQSUB_FAKE_DIR, PYQSUB_FAKE_LATENCY (s), PYQSUB_FAKE_FAILURE (per 10000) and PYQSUB_FAKE_ID_FORMAT
+[ $# -eq 0 ] && cat >/dev/null
+n=$(($(cat "$PYQSUB_FAKE_DIR/counter" 2>/dev/null || echo 0)+1))
+echo $n >"$PYQSUB_FAKE_DIR/counter"
+[ "$PYQSUB_FAKE_LATENCY" = "0" ] || sleep "$PYQSUB_FAKE_LATENCY"
+if [ $((n*7919%10000)) -lt "$PYQSUB_FAKE_FAILURE" ]; then echo "qsub: simulated failure" >&2; exit 1; fi
+printf "$PYQSUB_FAKE_ID_FORMAT\\n" $n
+"""
+FAKE_QSTAT="""#!/bin/sh
+# pyqsub benchmark fake qstat: lists every submitted job as completed with exit status 0 (qstat -x output)
+[ "$PYQSUB_FAKE_LATENCY" = "0" ] || sleep "$PYQSUB_FAKE_LATENCY"
+n=$(cat "$PYQSUB_FAKE_DIR/counter" 2>/dev/null || echo 0)
+echo "<Data>"
+awk -v n=$n -v f="$PYQSUB_FAKE_ID_FORMAT" 'BEGIN{for(i=1;i<=n;i++){printf "<Job><Job_Id>"f"</Job_Id><job_state>C</job_state><exit_status>0</exit_status></Job>\\n",i}}'
+echo "</Data>"
+"""
+class FakeScheduler(object):
+    """Context manager that puts a fake qsub and qstat first on the PATH and changes to a temporary working directory
+
+    The fake qsub prints job ids numbered from 1, after sleeping for latency seconds, and fails (exit code 1) for a deterministic
+    failure_rate fraction of the jobs. The fake qstat lists all the submitted jobs as completed.
+
+    Args
+        latency: float qsub and qstat latency in seconds [default=0]
+        failure_rate: float fraction of qsub calls that fail [default=0]
+        id_format: str printf format for the job ids [default=%d.fakeserver]
+
+    """
+    def __init__(self,latency=0.,failure_rate=0.,id_format='%d.fakeserver'):
+        self.latency=latency
+        self.failure_rate=failure_rate
+        self.id_format=id_format
+        self.path=None
+    def __enter__(self):
+        import stat,tempfile
+        self.path=tempfile.mkdtemp(prefix='pyqsub_benchmark_')
+        self._bin=os.path.join(self.path,'bin')
+        self.workdir=os.path.join(self.path,'work')
+        os.mkdir(self._bin)
+        os.mkdir(self.workdir)
+        for name,script in (('qsub',FAKE_QSUB),('qstat',FAKE_QSTAT)):
+            with open(os.path.join(self._bin,name),'w') as f:
+                f.write(script)
+            os.chmod(os.path.join(self._bin,name),stat.S_IRWXU)
+        self._environ=dict((key,os.environ.get(key)) for key in ('PATH','PYQSUB_FAKE_DIR','PYQSUB_FAKE_LATENCY','PYQSUB_FAKE_FAILURE','PYQSUB_FAKE_ID_FORMAT'))
+        os.environ.update(PATH=self._bin+os.pathsep+os.environ.get('PATH',''),PYQSUB_FAKE_DIR=self.path,PYQSUB_FAKE_LATENCY=str(self.latency),
+                          PYQSUB_FAKE_FAILURE=str(int(round(self.failure_rate*10000))),PYQSUB_FAKE_ID_FORMAT=self.id_format)
+        self._cwd=os.getcwd()
+        os.chdir(self.workdir)
+        return self
+    def files(self):
+        """Returns the number of files created in the working directory"""
+        return len(os.listdir(self.workdir))
+    def __exit__(self,*args):
+        import shutil
+        os.chdir(self._cwd)
+        for key,value in self._environ.items():
+            if value is None:
+                os.environ.pop(key,None)
+            else:
+                os.environ[key]=value
+        shutil.rmtree(self.path)
+LOAD_SIZES=(1,100,10000,100000)
+LOAD_WORKLOADS=('make_optstr','submit','cli')
+def _workload(name,options,options_map):
+    """Returns a function that runs job i of a load test workload"""
+    if name=='make_optstr':
+        return lambda i:make_optstr(dict(options,option_2=float(i)),options_map)
+    elif name=='submit':
+        return lambda i:submit(dict(options,option_2=float(i)),options_map,'bench_module')
+    elif name=='cli':
+        return lambda i:cli(['-j','echo '+str(i),'--name','bench','--qsub-stdin' if i%2 else '--qsub-sleep=0'])
+    raise ValueError('Unknown workload '+name)
+def load_benchmark(workloads=LOAD_WORKLOADS,sizes=LOAD_SIZES,latency=0.,failure_rate=0.,id_format='%d.fakeserver',memory=True):
+    """Runs submit(), make_optstr() and the command line __run__() against a fake scheduler at increasing numbers of jobs
+
+    The job script output of submit() is discarded. The peak memory is measured using tracemalloc (python 3.4+), which slows the
+    workloads down, so it can be turned off for throughput comparisons.
+
+    Args
+        workloads: list of workload names (make_optstr, submit or cli) [default=LOAD_WORKLOADS]
+        sizes: list of numbers of jobs [default=LOAD_SIZES]
+        latency: float fake qsub latency in seconds [default=0]
+        failure_rate: float fraction of fake qsub calls that fail [default=0]
+        id_format: str printf format for the fake job ids [default=%d.fakeserver]
+        memory: bool measure the peak memory [default=True]
+
+    Returns
+        results: list of dicts of workload, jobs, seconds, throughput (jobs/s), p50 and p99 latency (s), failures, files created
+            and peak_memory (bytes, None if not measured)
+
+    """
+    options,options_map=default_options()
+    try:
+        import tracemalloc
+    except ImportError:
+        tracemalloc=None
+    results=[]
+    for name in workloads:
+        for n in sizes:
+            with FakeScheduler(latency,failure_rate,id_format) as scheduler:
+                job=_workload(name,options,options_map)
+                latencies=[]
+                failures=0
+                stdout=sys.stdout
+                sys.stdout=open(os.devnull,'w')
+                if memory and tracemalloc:
+                    tracemalloc.start()
+                start=time.time()
+                try:
+                    for i in range(n):
+                        job_start=time.time()
+                        try:
+                            job(i)
+                        except QsubError:
+                            failures+=1
+                        latencies.append(time.time()-job_start)
+                    seconds=time.time()-start
+                    peak_memory=tracemalloc.get_traced_memory()[1] if memory and tracemalloc else None
+                finally:
+                    if memory and tracemalloc:
+                        tracemalloc.stop()
+                    sys.stdout.close()
+                    sys.stdout=stdout
+                latencies.sort()
+                results.append({'workload':name,'jobs':n,'seconds':seconds,'throughput':n/seconds if seconds else None,
+                                'p50':latencies[int(0.5*(n-1))],'p99':latencies[int(0.99*(n-1))],'failures':failures,
+                                'files':scheduler.files(),'peak_memory':peak_memory})
+    return results
+def save_results(results,path,**config):
+    """Saves benchmark results as JSON with the python version, platform and time
+
+    Args
+        results: benchmark results
+        path: str JSON file path
+        config: keyword arguments describing the benchmark configuration
+
+    """
+    import json,platform
+    with open(path,'w') as f:
+        json.dump({'python':platform.python_version(),'platform':platform.platform(),'time':time.time(),'config':config,'results':results},
+                  f,indent=2,sort_keys=True)
+def __run__(inputArgs=[]):
+    import argparse
+    parser=argparse.ArgumentParser(prog='pyqsub.benchmark',description="pyqsub benchmarks")
+    parser.add_argument('--template',action='store_true',default=False,help="Run the script rendering benchmark",dest='template')
+    parser.add_argument('--startup',action='store_true',default=False,help="Run the command line start up benchmark",dest='startup')
+    parser.add_argument('--load',action='store_true',default=False,help="Run the submission load test against a fake qsub/qstat",dest='load')
+    parser.add_argument('--workloads',type=str,default=','.join(LOAD_WORKLOADS),help="Set the load test workloads. [default="+','.join(LOAD_WORKLOADS)+"]",dest='workloads')
+    parser.add_argument('--sizes',type=str,default=','.join(str(size) for size in LOAD_SIZES),help="Set the load test numbers of jobs. [default="+','.join(str(size) for size in LOAD_SIZES)+"]",dest='sizes')
+    parser.add_argument('--latency',type=float,default=0.,help="Set the fake qsub latency in seconds. [default=0]",dest='latency')
+    parser.add_argument('--failurerate',type=float,default=0.,help="Set the fraction of fake qsub calls that fail. [default=0]",dest='failure_rate')
+    parser.add_argument('--idformat',type=str,default='%d.fakeserver',help="Set the printf format of the fake job ids. [default=%%d.fakeserver]",dest='id_format')
+    parser.add_argument('--nomemory',action='store_false',default=True,help="Do not measure the peak memory (tracemalloc slows the load test down)",dest='memory')
+    parser.add_argument('--output',type=str,default=False,help="Save the load test results to this JSON file",dest='output')
+    parser.add_argument('--budget',type=float,default=STARTUP_BUDGET,help="Set the start up import time budget in seconds. [default="+str(STARTUP_BUDGET)+"]",dest='budget')
+    options=parser.parse_args(inputArgs or sys.argv[1:])
+    run_all=not options.template and not options.startup and not options.load
+    exit_code=0
+    if options.template or run_all:
+        results=template_benchmark()
+        print ('Scripts rendered per second\n===============')
+        for key in sorted(results):
+            print ('{:<16s}{:>12.0f}'.format(key,results[key]))
+    if options.startup or run_all:
+        results=startup_benchmark(budget=options.budget)
+        print ('Start up time (ms)\n===============')
+        for key in ('interpreter','import','cli'):
+            print ('{:<16s}{:>12s}'.format(key,'-' if results[key] is None else '{:.1f}'.format(1000*results[key])))
+        print ('{:<16s}{:>12.1f} ({})'.format('budget',1000*results['budget'],'ok' if results['within_budget'] else 'EXCEEDED'))
+        if not results['within_budget']:
+            exit_code=1
+    if options.load:
+        config=dict(workloads=options.workloads.split(','),sizes=[int(size) for size in options.sizes.split(',')],latency=options.latency,
+                    failure_rate=options.failure_rate,id_format=options.id_format,memory=options.memory)
+        results=load_benchmark(**config)
+        print ('Load test\n===============')
+        print ('{:<12s}{:>8s}{:>12s}{:>10s}{:>10s}{:>10s}{:>8s}{:>12s}'.format('workload','jobs','jobs/s','p50 ms','p99 ms','failures','files','peak kB'))
+        for result in results:
+            print ('{:<12s}{:>8d}{:>12.0f}{:>10.3f}{:>10.3f}{:>10d}{:>8d}{:>12s}'.format(result['workload'],result['jobs'],result['throughput'] or 0,
+                   1000*result['p50'],1000*result['p99'],result['failures'],result['files'],
+                   '-' if result['peak_memory'] is None else '{:.0f}'.format(result['peak_memory']/1024.)))
+        if options.output:
+            save_results(results,options.output,**config)
+    sys.exit(exit_code)
+if __name__=="__main__":
+    __run__()
@@ -0,0 +1,140 @@
+"""cache
+******************
+
+Submission deduplication for pyqsub.
+
+The scripts of submitted jobs are hashed (after normalising whitespace and comments) and stored in a SQLite database with the job id. If the
+qsub_cache option (--qsub-cache) is set to the database path, submit() skips jobs with an identical script that are queued, running, or have completed
+successfully, and returns the job id of the earlier job instead, so a sweep can be re-run after a partial failure and only the failed or missing jobs
+are resubmitted. Setting the qsub_force option (--qsub-force) always submits the job.
+
+The states of the cached jobs are checked using a JobTracker, so a single qstat call is made for all the cached jobs (at most every ttl seconds),
+and only when a matching script is found. Jobs that have completed successfully are marked in the cache and not checked again, and jobs that
+have failed are resubmitted. Torque stops listing completed jobs after keep_completed seconds, so the outcome of jobs that are no longer listed
+by qstat is unknown. These jobs are kept in the cache and not resubmitted, unless the qsub_force option is set. As the job states are read
+using qstat, the cache can only be used with the pbs backend.
+
+-------------------------------------------
+
+Copyright (c) 2015 David J Pugh
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
+import hashlib,sqlite3,threading,time
+try:
+    from .tracker import JobTracker,FINISHED_STATES
+except (ImportError,ValueError,SystemError):
+    from tracker import JobTracker,FINISHED_STATES
+def script_key(qsub_script):
+    """Returns the cache key for a job script
+
+    The key is the sha256 hash of the script with trailing whitespace, blank lines and ## comment lines removed (the #! and scheduler
+    directive lines are kept).
+
+    Args
+        qsub_script: str job script
+
+    Returns
+        key: str hex digest
+
+    """
+    lines=[line.rstrip() for line in qsub_script.splitlines()]
+    normalised='\n'.join(line for line in lines if line and not line.startswith('##'))
+    return hashlib.sha256(normalised.encode('utf-8')).hexdigest()
+class SubmissionCache(object):
+    """Cache of submitted job scripts and job ids
+
+    Args
+        path: str SQLite database path
+        max_entries: int maximum number of cached jobs, the oldest are evicted first [default=100000]
+        max_age: float maximum age in seconds of cached jobs [default=30 days]
+        ttl: float time in seconds to cache the job states from qstat for [default=30]
+        qstat: list qstat command (must return XML) [default=['qstat','-x','-t']]
+
+    """
+    def __init__(self,path,max_entries=100000,max_age=30*86400.,ttl=30.,qstat=['qstat','-x','-t']):
+        self.path=path
+        self.max_entries=max_entries
+        self.max_age=max_age
+        self._tracker=JobTracker(ttl,qstat)
+        self._lock=threading.RLock()#the connection is shared by the SubmissionPool threads
+        self._connection=sqlite3.connect(path,timeout=30,check_same_thread=False)
+        with self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS jobs (key TEXT PRIMARY KEY, job_id TEXT, name TEXT, submitted REAL, succeeded INTEGER)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS jobs_submitted ON jobs (submitted)')
+        self._added=0
+        self.evict()
+    def close(self):
+        """Closes the database"""
+        self._connection.close()
+    def evict(self):
+        """Removes the jobs older than max_age and the oldest jobs above max_entries
+
+        Returns
+            n: int number of jobs removed
+
+        """
+        with self._lock,self._connection:
+            n=self._connection.execute('DELETE FROM jobs WHERE submitted<?',(time.time()-self.max_age,)).rowcount
+            n+=self._connection.execute('DELETE FROM jobs WHERE key IN (SELECT key FROM jobs ORDER BY submitted DESC LIMIT -1 OFFSET ?)',
+                                        (self.max_entries,)).rowcount
+        return n
+    def lookup(self,qsub_script):
+        """Returns the job id of an identical job that is queued, running, has completed successfully or is no longer listed by qstat
+
+        Args
+            qsub_script: str job script
+
+        Returns
+            job_id: str job id or None if the job needs to be submitted
+
+        """
+        key=script_key(qsub_script)
+        with self._lock:
+            row=self._connection.execute('SELECT job_id, succeeded FROM jobs WHERE key=?',(key,)).fetchone()
+            if row is None:
+                return None
+            job_id,succeeded=row
+            if succeeded:
+                return job_id
+            if not self._tracker.jobs:
+                #Track all the unfinished cached jobs so that one qstat call checks them all
+                self._tracker.track(*[pending[0] for pending in self._connection.execute('SELECT job_id FROM jobs WHERE succeeded=0')])
+            self._tracker.track(job_id)
+            if self._tracker.state(job_id) not in FINISHED_STATES:
+                return job_id
+            exit_status=self._tracker.exit_status(job_id)
+            if exit_status is None:
+                return job_id#No longer listed by qstat, so the outcome is unknown and the entry is kept
+            if exit_status==0:
+                with self._connection:
+                    self._connection.execute('UPDATE jobs SET succeeded=1 WHERE key=?',(key,))
+                return job_id
+            with self._connection:
+                self._connection.execute('DELETE FROM jobs WHERE key=?',(key,))
+            return None
+    def add(self,qsub_script,job_id,name=''):
+        """Adds a submitted job to the cache
+
+        Args
+            qsub_script: str job script
+            job_id: str job id returned by qsub
+            name: str job name [default='']
+
+        """
+        with self._lock:
+            with self._connection:
+                self._connection.execute('INSERT OR REPLACE INTO jobs (key, job_id, name, submitted, succeeded) VALUES (?,?,?,?,0)',
+                                         (script_key(qsub_script),job_id,str(name),time.time()))
+            self._added+=1
+            if not self._added%1000:
+                self.evict()
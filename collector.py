@@ -0,0 +1,155 @@
+"""collector
+******************
+
+Job output collection for pyqsub.
+
+Jobs submitted with the qsub_outdir option (--qsub-outdir) write their stdout and stderr files (name.o<id> and name.e<id>) to a directory per sweep.
+An OutputCollector moves the files of finished jobs from the directory into a single uncompressed append-only Archive (see pyqsub.archive.Archive),
+keyed by the job id and stream (e.g. 1234.o and 1234.e, or 1234[5].o for array jobs), so a sweep of thousands of jobs leaves two files rather than
+thousands, and the outputs can be searched using a memory map of the archive::
+
+    from pyqsub.collector import OutputCollector
+    collector=OutputCollector('sweep_output')
+    collector.stream(job_ids)
+    for key,line in collector.grep('Traceback'):
+        print(key,line)
+
+-------------------------------------------
+
+Copyright (c) 2015 David J Pugh
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
+import os,re,time
+try:
+    from .archive import Archive
+    from .tracker import JobTracker,short_id
+except (ImportError,ValueError,SystemError):
+    from archive import Archive
+    from tracker import JobTracker,short_id
+OUTPUT_FILE=re.compile(r'^.+\.(?P<stream>[oe])(?P<job_id>\d+(?:-\d+|\[\d*\]|_\d+)?)$')
+def output_files(outdir):
+    """Lists the job output files in a directory
+
+    Torque array job files (name.o1234-5) are keyed by the pyqsub array job id (1234[5]).
+
+    Args
+        outdir: str output directory path
+
+    Returns
+        files: dict mapping job ids to lists of (stream,path) tuples
+
+    """
+    files={}
+    for filename in os.listdir(outdir):
+        match=OUTPUT_FILE.match(filename)
+        if match:
+            job_id=match.group('job_id')
+            if '-' in job_id:
+                job_id=job_id.replace('-','[')+']'
+            files.setdefault(job_id,[]).append((match.group('stream'),os.path.join(outdir,filename)))
+    return files
+class OutputCollector(object):
+    """Collects the output files of finished jobs into an archive
+
+    Args
+        outdir: str job output directory (qsub_outdir)
+        archive: str archive path [default=outdir+'.outputs']
+        tracker: JobTracker used to check which jobs have finished [default=new JobTracker]
+        remove: bool remove the output files once they are archived [default=True]
+
+    """
+    def __init__(self,outdir,archive=None,tracker=None,remove=True):
+        self.outdir=outdir
+        self.archive=Archive(archive or outdir.rstrip(os.sep)+'.outputs',compress=False)
+        self.tracker=tracker if tracker is not None else JobTracker()
+        self.remove=remove
+        self.missing=[]
+    def collect(self,job_ids=None):
+        """Archives the output files in the output directory
+
+        The files are read with a single directory listing. PBS copies the output files to the output directory when a job finishes,
+        but other schedulers write to them while the job runs, so job_ids should only contain finished jobs.
+
+        Args
+            job_ids: list of job ids to collect [default=all the files in the directory]
+
+        Returns
+            job_ids: list of the job ids collected
+
+        """
+        files=output_files(self.outdir)
+        if job_ids is not None:
+            job_ids=set(short_id(job_id) for job_id in job_ids)
+            files=dict((job_id,job_files) for job_id,job_files in files.items() if job_id in job_ids)
+        for job_id,job_files in sorted(files.items()):
+            for stream,path in sorted(job_files):
+                with open(path,'rb') as f:
+                    self.archive.append(job_id+'.'+stream,f.read())
+                if self.remove:
+                    os.remove(path)
+        return list(files.keys())
+    def stream(self,job_ids,timeout=None,interval=None,stage_timeout=300.):
+        """Archives the output files of jobs as they finish
+
+        The job states are checked with one qstat call per interval (see pyqsub.tracker.JobTracker) and the finished jobs are collected
+        in a batch. The scheduler may copy the output files after the job has finished, so finished jobs are kept until their files have
+        been collected, or for stage_timeout seconds, after which they are added to OutputCollector.missing.
+
+        Args
+            job_ids: list of job ids
+            timeout: float maximum time in seconds to wait [default=None]
+            interval: float polling interval in seconds [default=tracker ttl]
+            stage_timeout: float maximum time in seconds to wait for the output files of a finished job [default=300]
+
+        Returns
+            remaining: list of the job ids that had not finished and been collected by the timeout
+
+        """
+        self.tracker.track(*job_ids)
+        interval=self.tracker.ttl if interval is None else interval
+        remaining=list(job_ids)
+        finished_at={}
+        start=time.time()
+        while remaining:
+            now=time.time()
+            for job_id in remaining:
+                if job_id not in finished_at and self.tracker.done(job_id):
+                    finished_at[job_id]=now
+            finished=[job_id for job_id in remaining if job_id in finished_at]
+            if finished:
+                collected=set(self.collect(finished))
+                staged=[]
+                for job_id in remaining:
+                    if short_id(job_id) in collected:
+                        continue
+                    if job_id in finished_at and now-finished_at[job_id]>=stage_timeout:
+                        self.missing.append(job_id)
+                        continue
+                    staged.append(job_id)
+                remaining=staged
+            if not remaining or (timeout is not None and time.time()-start>=timeout):
+                break
+            time.sleep(interval if timeout is None else min(interval,max(timeout-(time.time()-start),0)))
+            self.tracker.refresh(force=True)
+        return remaining
+    def get(self,job_id,stream='o'):
+        """Returns the stdout (stream o) or stderr (stream e) of a job"""
+        return self.archive.get(short_id(job_id)+'.'+stream)
+    def grep(self,pattern,flags=0):
+        """Searches the archived outputs for lines matching a regular expression
+
+        Returns
+            matches: generator of (key,line) tuples, where the key is the job id and stream (e.g. 1234.e)
+
+        """
+        return self.archive.grep(pattern,flags)
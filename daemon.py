@@ -0,0 +1,243 @@
+"""daemon
+******************
+
+Submission daemon for pyqsub.
+
+The daemon listens on a Unix socket for job specs sent as single lines of JSON, with the same fields as the arguments to submit()::
+
+    {"options": {"qsub_N": "job", "seed": 1}, "options_map": {"seed": "--seed"}, "module_name": "module_name"}
+
+or::
+
+    {"options": {"qsub_walltime": "00:10:00"}, "job_string": "echo hello"}
+
+The options are added to the parser_group() defaults, which the daemon builds once when it starts. Requests that arrive within the batch
+window of each other and share their qsub options are submitted together as an array job, so a burst of requests needs a single qsub call.
+The daemon replies with a line of JSON containing the job_id (or an error) once the job has been submitted.
+
+Start the daemon using pyqsub serve [--socket path] [--window seconds], and submit to it using pyqsub --socket path -j ..., daemon_submit(),
+or any tool that can write a line to a Unix socket.
+
+-------------------------------------------
+
+Copyright (c) 2015 David J Pugh
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
+import os,sys,json,socket,threading,time
+try:
+    import socketserver
+    import queue
+except ImportError:
+    import SocketServer as socketserver
+    import Queue as queue
+try:
+    from .__core__ import submit,submit_array,parser_group,QsubError
+except (ImportError,ValueError,SystemError):
+    from __core__ import submit,submit_array,parser_group,QsubError
+DEFAULT_SOCKET=os.environ.get('PYQSUB_SOCKET',os.path.expanduser('~/.pyqsub.sock'))
+def default_options(module_name='pyqsub'):
+    """Returns the parser_group() default options
+
+    Args
+        module_name: str module name for the default job name [default=pyqsub]
+
+    Returns
+        options: dict of default options and values
+
+    """
+    import argparse
+    parser=argparse.ArgumentParser()
+    parser_group(module_name,parser.add_argument_group('Cluster'))
+    return vars(parser.parse_args([]))
+try:
+    STRING_TYPES=(str,unicode)
+except NameError:
+    STRING_TYPES=(str,)
+SPEC_TYPES={'options':(dict,),'options_map':(dict,),'module_name':STRING_TYPES+(bool,),'job_string':STRING_TYPES+(bool,),'list_delimiter':STRING_TYPES}
+def check_spec(spec):
+    """Checks that a job spec is a dict with fields of the right types
+
+    Args
+        spec: decoded JSON job spec
+
+    Raises
+        ValueError: if the spec is invalid
+
+    """
+    if not isinstance(spec,dict):
+        raise ValueError("job spec must be a JSON object")
+    for field,value in spec.items():
+        if field not in SPEC_TYPES:
+            raise ValueError("unknown field "+field)
+        if not isinstance(value,SPEC_TYPES[field]):
+            raise ValueError("invalid type for field "+field)
+    if not spec.get('module_name') and not spec.get('job_string'):
+        raise ValueError("one of module_name and job_string must be specified")
+class _Request(object):
+    def __init__(self,spec):
+        self.spec=spec
+        self.response=None
+        self.done=threading.Event()
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            line=line.strip()
+            if not line:
+                continue
+            try:
+                spec=json.loads(line.decode('utf-8'))
+                check_spec(spec)
+            except ValueError as e:
+                self._reply({'error':'invalid request: '+str(e)})
+                continue
+            request=_Request(spec)
+            self.server.submission_server.put(request)
+            request.done.wait()
+            self._reply(request.response)
+    def _reply(self,response):
+        self.wfile.write((json.dumps(response)+'\n').encode('utf-8'))
+        self.wfile.flush()
+class _UnixServer(socketserver.ThreadingMixIn,socketserver.UnixStreamServer):
+    daemon_threads=True
+class SubmissionServer(object):
+    """Submission daemon listening on a Unix socket
+
+    Args
+        socket_path: str Unix socket path [default=DEFAULT_SOCKET]
+        batch_window: float time in seconds to wait for more requests to batch into an array job [default=0.05]
+        max_batch: int maximum number of jobs in a batch [default=1000]
+        defaults: dict of default options [default=parser_group() defaults]
+
+    """
+    def __init__(self,socket_path=DEFAULT_SOCKET,batch_window=0.05,max_batch=1000,defaults=None):
+        self.socket_path=socket_path
+        self.batch_window=batch_window
+        self.max_batch=max_batch
+        self.defaults=defaults if defaults is not None else default_options()
+        self._queue=queue.Queue()
+        self._server=None
+    def put(self,request):
+        """Queues a request for submission"""
+        self._queue.put(request)
+    def serve_forever(self):
+        """Listens for requests until interrupted, removing the socket file when it stops"""
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self._server=_UnixServer(self.socket_path,_Handler)
+        self._server.submission_server=self
+        batcher=threading.Thread(target=self._batch_loop)
+        batcher.daemon=True
+        batcher.start()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+    def shutdown(self):
+        """Stops the server (from another thread)"""
+        if self._server is not None:
+            self._server.shutdown()
+    def _batch_loop(self):
+        while True:
+            batch=[self._queue.get()]
+            deadline=time.time()+self.batch_window
+            while len(batch)<self.max_batch:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline-time.time(),0)))
+                except queue.Empty:
+                    break
+            self.submit_batch(batch)
+    def submit_batch(self,batch):
+        """Submits a batch of requests, grouping requests with the same qsub options into array jobs
+
+        Args
+            batch: list of requests
+
+        """
+        groups={}
+        for request in batch:
+            try:
+                spec=request.spec
+                options=dict(self.defaults,**spec.get('options',{}))
+                request.options=options
+                job_string=spec.get('job_string',False)
+                key=json.dumps([spec.get('module_name',False),bool(job_string),spec.get('options_map',{}),spec.get('list_delimiter',','),
+                                dict((option,value) for option,value in options.items() if 'qsub' in option)],sort_keys=True)
+                if job_string and '\n' in job_string.rstrip('\n'):
+                    key=id(request)#Multi-line job strings cannot be array tasks
+            except Exception as e:
+                request.response={'error':e.__class__.__name__+': '+str(e)}
+                request.done.set()
+                continue
+            groups.setdefault(key,[]).append(request)
+        for requests in groups.values():
+            spec=requests[0].spec
+            try:
+                if len(requests)==1:
+                    job_ids=[submit(requests[0].options,spec.get('options_map',{}),spec.get('module_name',False),spec.get('job_string',False),
+                                    spec.get('list_delimiter',','))]
+                elif spec.get('job_string',False):
+                    job_ids=submit_array(requests[0].options,job_string=[request.spec['job_string'] for request in requests])
+                else:
+                    job_ids=submit_array([request.options for request in requests],spec.get('options_map',{}),spec.get('module_name',False),
+                                         list_delimiter=spec.get('list_delimiter',','))
+                responses=[{'job_id':job_id} for job_id in job_ids]
+            except Exception as e:
+                responses=[{'error':e.__class__.__name__+': '+str(e)}]*len(requests)
+            for request,response in zip(requests,responses):
+                request.response=response
+                request.done.set()
+def daemon_submit(options={},options_map={},module_name=False,job_string=False,list_delimiter=',',socket_path=DEFAULT_SOCKET):
+    """Submits job to cluster using the submission daemon
+
+    Takes the same arguments as pyqsub.submit(), but only the options that differ from the parser_group() defaults are needed.
+
+    Args
+        socket_path: str daemon Unix socket path [default=DEFAULT_SOCKET]
+
+    Returns
+        job_id: str job id returned by qsub
+
+    """
+    if not module_name and not job_string:
+        raise TypeError("One of module_name and job_string must be specified.")
+    spec={'options':options,'options_map':options_map,'module_name':module_name,'job_string':job_string,'list_delimiter':list_delimiter}
+    client=socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        client.sendall((json.dumps(spec)+'\n').encode('utf-8'))
+        response=client.makefile('rb').readline()
+    finally:
+        client.close()
+    if not response:
+        raise QsubError('No response from pyqsub daemon at '+socket_path)
+    response=json.loads(response.decode('utf-8'))
+    if 'error' in response:
+        raise QsubError(response['error'])
+    return response['job_id']
+def __run__(inputArgs=[]):
+    import argparse
+    parser=argparse.ArgumentParser(prog='pyqsub serve',description="Run the pyqsub submission daemon")
+    parser.add_argument('--socket',type=str,default=DEFAULT_SOCKET,help="Set the Unix socket path. [default="+DEFAULT_SOCKET+"]",dest='socket')
+    parser.add_argument('--window',type=float,default=0.05,help="Set the time in seconds to wait to batch requests into array jobs. [default=0.05]",dest='window')
+    parser.add_argument('--maxbatch',type=int,default=1000,help="Set the maximum number of jobs in a batch. [default=1000]",dest='max_batch')
+    options=parser.parse_args(inputArgs or sys.argv[1:])
+    import signal
+    signal.signal(signal.SIGTERM,lambda signum,frame:sys.exit(0))
+    try:
+        SubmissionServer(options.socket,options.window,options.max_batch).serve_forever()
+    except KeyboardInterrupt:
+        pass
+if __name__=="__main__":
+    __run__()
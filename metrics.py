@@ -0,0 +1,163 @@
+"""metrics
+******************
+
+Submission timing instrumentation for pyqsub.
+
+Hooks added using add_hook() are called with a dict for each timed phase of a submission:
+
+    * event - phase name: make_optstr, render, write, qsub, rename or parse
+    * name - job name
+    * start - start time (seconds since the epoch)
+    * duration - duration in seconds
+
+The JSONLinesExporter and PrometheusExporter hooks export the events to a JSON lines file or a Prometheus textfile collector file. If the
+qsub_timestamps option (--qsub-timestamps) is set, the job prints start and end markers to stderr, which can be read using parse_markers() to get
+the queue wait and run time of the job.
+
+-------------------------------------------
+
+Copyright (c) 2015 David J Pugh
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
+import time
+_hooks=[]
+START_MARKER='pyqsub_start'
+END_MARKER='pyqsub_end'
+def add_hook(hook):
+    """Adds a timing hook
+
+    Args
+        hook: callable called with a dict for each timing event
+
+    """
+    _hooks.append(hook)
+def remove_hook(hook):
+    """Removes a timing hook"""
+    _hooks.remove(hook)
+def emit(event):
+    """Calls the hooks with an event dict"""
+    for hook in list(_hooks):
+        hook(event)
+class timed(object):
+    """Context manager that emits a timing event for the enclosed block if any hooks have been added
+
+    Args
+        event: str phase name
+        info: keyword arguments added to the event dict (e.g. name)
+
+    """
+    def __init__(self,event,**info):
+        self.event=event
+        self.info=info
+        self.start=None
+    def __enter__(self):
+        if _hooks:
+            self.start=time.time()
+        return self
+    def __exit__(self,*args):
+        if _hooks and self.start is not None:
+            event=dict(self.info,event=self.event,start=self.start,duration=time.time()-self.start)
+            emit(event)
+def markers():
+    """Returns the script lines that print the start and end markers (with the exit status) to stderr"""
+    return ('echo "'+START_MARKER+' $(date +%s.%N)" >&2\n'+
+            'trap \'PYQSUB_EXIT=$?; echo "'+END_MARKER+' $(date +%s.%N) $PYQSUB_EXIT" >&2\' EXIT\n')
+def parse_markers(text,submit_time=None):
+    """Parses the start and end markers from the job stderr
+
+    Args
+        text: str job stderr
+        submit_time: float submission time (e.g. the end of the qsub event) to calculate the queue wait [default=None]
+
+    Returns
+        timings: dict of start, end, exit_status, run_time and queue_wait (None if not known)
+
+    """
+    timings=dict(start=None,end=None,exit_status=None,run_time=None,queue_wait=None)
+    for line in text.splitlines():
+        parts=line.split()
+        if len(parts)>=2 and parts[0]==START_MARKER:
+            timings['start']=float(parts[1])
+        elif len(parts)>=3 and parts[0]==END_MARKER:
+            timings['end']=float(parts[1])
+            timings['exit_status']=int(parts[2])
+    if timings['start'] is not None and timings['end'] is not None:
+        timings['run_time']=timings['end']-timings['start']
+    if timings['start'] is not None and submit_time is not None:
+        timings['queue_wait']=timings['start']-submit_time
+    return timings
+class JSONLinesExporter(object):
+    """Timing hook that appends each event as a line of JSON to a file
+
+    Args
+        path: str file path
+
+    """
+    def __init__(self,path):
+        import threading
+        self.path=path
+        self._lock=threading.Lock()
+    def __call__(self,event):
+        import json
+        with self._lock:
+            with open(self.path,'a') as f:
+                f.write(json.dumps(event,sort_keys=True)+'\n')
+class PrometheusExporter(object):
+    """Timing hook that summarises the event durations for the Prometheus node exporter textfile collector
+
+    The durations of the last max_samples events of each phase are kept, and PrometheusExporter.write() writes a summary with
+    the 0.5, 0.9 and 0.99 quantiles, sum and count for each phase (as pyqsub_phase_duration_seconds).
+
+    Args
+        path: str textfile path (should end in .prom)
+        max_samples: int number of durations kept for each phase for the quantiles [default=10000]
+        write_every: int write the file after this many events, or 0 to only write when PrometheusExporter.write() is called [default=0]
+
+    """
+    quantiles=(0.5,0.9,0.99)
+    def __init__(self,path,max_samples=10000,write_every=0):
+        self.path=path
+        self.max_samples=max_samples
+        self.write_every=write_every
+        self.samples={}
+        self.sums={}
+        import threading
+        self.counts={}
+        self._lock=threading.Lock()
+    def __call__(self,event):
+        with self._lock:
+            phase=event['event']
+            if phase not in self.samples:
+                from collections import deque
+                self.samples[phase]=deque(maxlen=self.max_samples)
+            self.samples[phase].append(event['duration'])
+            self.sums[phase]=self.sums.get(phase,0.)+event['duration']
+            self.counts[phase]=self.counts.get(phase,0)+1
+            write=self.write_every and not sum(self.counts.values())%self.write_every
+        if write:
+            self.write()
+    def write(self):
+        """Writes the textfile (atomically, using a temporary file and rename)"""
+        import os
+        lines=['# HELP pyqsub_phase_duration_seconds Duration of pyqsub submission phases.','# TYPE pyqsub_phase_duration_seconds summary']
+        with self._lock:
+            for phase in sorted(self.samples):
+                samples=sorted(self.samples[phase])
+                for quantile in self.quantiles:
+                    value=samples[min(int(quantile*len(samples)),len(samples)-1)]
+                    lines.append('pyqsub_phase_duration_seconds{phase="'+phase+'",quantile="'+str(quantile)+'"} '+repr(value))
+                lines.append('pyqsub_phase_duration_seconds_sum{phase="'+phase+'"} '+repr(self.sums[phase]))
+                lines.append('pyqsub_phase_duration_seconds_count{phase="'+phase+'"} '+str(self.counts[phase]))
+        with open(self.path+'.tmp','w') as f:
+            f.write('\n'.join(lines)+'\n')
+        os.rename(self.path+'.tmp',self.path)
@@ -0,0 +1,137 @@
+"""packing
+******************
+
+Task packing for pyqsub.
+
+Many short commands are packed into a few jobs, and inside each job a runner executes the commands on a process pool with one worker
+per processor. The workers take the next command from a shared queue as soon as they are free, so long and short commands balance
+out across the workers. The runner is run on the cluster using::
+
+    python -m pyqsub.packing tasks_file results_file workers
+
+and writes a tab separated line for each command to the results file: the command index, exit code, start time and duration (s).
+
+-------------------------------------------
+
+Copyright (c) 2015 David J Pugh
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
+import os,sys,subprocess,tempfile,time,multiprocessing
+try:
+    from .__core__ import submit_array
+except (ImportError,ValueError,SystemError):
+    from __core__ import submit_array
+def read_commands(commands):
+    """Reads the commands to pack
+
+    Args
+        commands: list of command strings or str path to a file with one command per line
+
+    Returns
+        commands: list of commands (blank lines are skipped)
+
+    """
+    if not isinstance(commands,(list,tuple)):
+        with open(commands) as f:
+            commands=f.readlines()
+    commands=[command.strip() for command in commands if command.strip()]
+    if any('\n' in command for command in commands):
+        raise ValueError("Packed commands must be single line.")
+    return commands
+def submit_packed(options,commands,jobs=None):
+    """Submits commands packed into a number of jobs
+
+    The commands are split into jobs contiguous groups, which are submitted as a single array job. Each job runs its commands
+    using a process pool of qsub_ppn workers on a single node, so qsub_nodes must be 1.
+
+    Args
+        options: dict of options and values
+        commands: list of command strings or str path to a file with one command per line
+        jobs: int number of jobs to pack the commands into [default=options['qsub_pack'] or 1]
+
+    Returns
+        job_ids,results_files: list of job ids and list of the results file path for each job
+
+    """
+    if int(options['qsub_nodes'])>1:
+        raise ValueError("Packed jobs run on a single node, but qsub_nodes="+str(options['qsub_nodes'])+" nodes were requested.")
+    commands=read_commands(commands)
+    if not len(commands):
+        raise ValueError("No commands to submit.")
+    jobs=min(int(jobs or options.get('qsub_pack') or 1),len(commands))
+    fd,prefix=tempfile.mkstemp(prefix=str(options['qsub_N'])+'_',suffix='',dir=os.getcwd())
+    os.close(fd)
+    os.remove(prefix)
+    job_strings=[]
+    results_files=[]
+    for i in range(jobs):
+        tasks_file=prefix+'_'+str(i)+'.pack'
+        with open(tasks_file,'w') as f:
+            f.write('\n'.join(commands[i*len(commands)//jobs:(i+1)*len(commands)//jobs])+'\n')
+        results_files.append(prefix+'_'+str(i)+'.results')
+        job_strings.append("python -m pyqsub.packing '"+tasks_file+"' '"+results_files[-1]+"' "+str(options['qsub_ppn']))
+    return submit_array(options,job_string=job_strings),results_files
+def read_results(results_file):
+    """Reads a packed job results file
+
+    Args
+        results_file: str results file path
+
+    Returns
+        results: list of (index,exit_code,start,duration) tuples in the order the commands finished
+
+    """
+    results=[]
+    with open(results_file) as f:
+        for line in f:
+            index,exit_code,start,duration=line.split('\t')
+            results.append((int(index),int(exit_code),float(start),float(duration)))
+    return results
+def _run_task(task):
+    index,command=task
+    start=time.time()
+    exit_code=subprocess.call(command,shell=True)
+    return index,exit_code,start,time.time()-start
+def run(tasks_file,results_file,workers=None):
+    """Runs the commands in a tasks file on a process pool
+
+    Args
+        tasks_file: str path to file with one command per line
+        results_file: str path to write the results to
+        workers: int number of worker processes [default=number of cores]
+
+    Returns
+        exit_code: int 0 if all the commands succeeded, otherwise 1
+
+    """
+    commands=read_commands(tasks_file)
+    pool=multiprocessing.Pool(int(workers or multiprocessing.cpu_count()))
+    failed=False
+    try:
+        with open(results_file,'w') as f:
+            for index,exit_code,start,duration in pool.imap_unordered(_run_task,enumerate(commands),chunksize=1):
+                f.write(str(index)+'\t'+str(exit_code)+'\t'+'%.3f'%start+'\t'+'%.3f'%duration+'\n')
+                f.flush()
+                failed=failed or exit_code!=0
+    finally:
+        pool.close()
+        pool.join()
+    return int(failed)
+def __run__(inputArgs=[]):
+    args=inputArgs or sys.argv[1:]
+    if len(args) not in (2,3):
+        sys.stderr.write('usage: python -m pyqsub.packing tasks_file results_file [workers]\n')
+        sys.exit(2)
+    sys.exit(run(*args))
+if __name__=="__main__":
+    __run__()
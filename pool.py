@@ -0,0 +1,103 @@
+"""pool
+******************
+
+Concurrent job submission for pyqsub.
+
+-------------------------------------------
+
+Copyright (c) 2015 David J Pugh
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
+import time
+try:
+    from .__core__ import submit,QsubError
+except (ImportError,ValueError,SystemError):
+    from __core__ import submit,QsubError
+class SubmissionPool(object):
+    """Pool of worker threads for submitting jobs concurrently
+
+    Each call to SubmissionPool.submit() returns a concurrent.futures.Future that resolves to the job id. At most workers qsub calls are in flight
+    at once, and SubmissionPool.submit() blocks once max_pending jobs are waiting, so a long submission loop cannot run ahead of the scheduler.
+    Failed qsub calls (QsubError) are retried with exponential backoff.
+
+    Requires concurrent.futures (the futures package on python 2).
+
+    Args
+        workers: int number of worker threads (maximum number of concurrent qsub calls) [default=4]
+        max_pending: int maximum number of submitted but unfinished jobs before SubmissionPool.submit() blocks [default=100]
+        retries: int number of times to retry a failed qsub call [default=3]
+        backoff: float initial delay in seconds before retrying, doubled for each retry [default=1]
+
+    """
+    def __init__(self,workers=4,max_pending=100,retries=3,backoff=1.):
+        import threading
+        try:
+            from concurrent.futures import ThreadPoolExecutor
+        except ImportError:
+            raise ImportError("SubmissionPool requires concurrent.futures (pip install futures for python 2).")
+        self.retries=retries
+        self.backoff=backoff
+        self._executor=ThreadPoolExecutor(max_workers=workers)
+        self._pending=threading.BoundedSemaphore(max(max_pending,workers))
+    def submit(self,options,options_map={},module_name=False,job_string=False,list_delimiter=','):
+        """Submits job to cluster in the pool
+
+        Takes the same arguments as pyqsub.submit(), blocking while max_pending jobs are waiting.
+
+        Returns
+            future: concurrent.futures.Future that resolves to the job id
+
+        """
+        self._pending.acquire()
+        try:
+            future=self._executor.submit(self._submit,options,options_map,module_name,job_string,list_delimiter)
+        except:
+            self._pending.release()
+            raise
+        future.add_done_callback(lambda f:self._pending.release())
+        return future
+    def map(self,options,options_map={},module_name=False,job_string=False,list_delimiter=','):
+        """Submits a job for each options dict in the pool
+
+        Args:
+            options: iterable of dicts of options and values
+
+        Other arguments are as for pyqsub.submit()
+
+        Returns
+            futures: list of concurrent.futures.Future objects, one for each job
+
+        """
+        return [self.submit(job_options,options_map,module_name,job_string,list_delimiter) for job_options in options]
+    def _submit(self,options,options_map,module_name,job_string,list_delimiter):
+        attempt=0
+        while True:
+            try:
+                return submit(options,options_map,module_name,job_string,list_delimiter)
+            except QsubError:
+                if attempt>=self.retries:
+                    raise
+                time.sleep(self.backoff*2**attempt)
+                attempt+=1
+    def shutdown(self,wait=True):
+        """Shuts down the pool
+
+        Args
+            wait: bool wait for pending submissions to finish [default=True]
+
+        """
+        self._executor.shutdown(wait=wait)
+    def __enter__(self):
+        return self
+    def __exit__(self,*args):
+        self.shutdown()
@@ -0,0 +1,50 @@
+"""Test configuration for pyqsub
+
+The repository root is the pyqsub package (package_dir={'pyqsub':'.'} in setup.py), so it is imported as pyqsub from the root rather than from
+any installed version. The tests run against the fake qsub and qstat from pyqsub.benchmark.FakeScheduler.
+"""
+import os,sys
+import pytest
+ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+def _import_pyqsub():
+    try:
+        import importlib.util
+        spec=importlib.util.spec_from_file_location('pyqsub',os.path.join(ROOT,'__init__.py'),submodule_search_locations=[ROOT])
+        module=importlib.util.module_from_spec(spec)
+        sys.modules['pyqsub']=module
+        spec.loader.exec_module(module)
+    except ImportError:
+        import imp
+        imp.load_module('pyqsub',None,ROOT,('','',imp.PKG_DIRECTORY))
+if os.path.dirname(os.path.abspath(getattr(sys.modules.get('pyqsub'),'__file__','') or ''))!=ROOT:
+    sys.modules.pop('pyqsub',None)
+    _import_pyqsub()
+from pyqsub.benchmark import FakeScheduler,default_options
+@pytest.fixture
+def scheduler():
+    """Fake scheduler (all jobs are listed as completed with exit status 0), with the working directory changed to a temporary directory"""
+    with FakeScheduler() as fake:
+        yield fake
+@pytest.fixture
+def options():
+    """Submission options and options_map"""
+    return default_options(2)
+@pytest.fixture
+def qstat(scheduler):
+    """Returns a function that sets the jobs listed by a fake qstat command
+
+    The function takes a dict mapping job ids to job_state or (job_state,exit_status) tuples, and returns the qstat command.
+    """
+    path=os.path.join(scheduler.path,'qstat.xml')
+    def set_jobs(jobs):
+        with open(path,'w') as f:
+            f.write('<Data>')
+            for job_id,state in sorted(jobs.items()):
+                state,exit_status=state if isinstance(state,tuple) else (state,None)
+                f.write('<Job><Job_Id>'+job_id+'</Job_Id><job_state>'+state+'</job_state>')
+                if exit_status is not None:
+                    f.write('<exit_status>'+str(exit_status)+'</exit_status>')
+                f.write('</Job>')
+            f.write('</Data>')
+        return ['cat',path]
+    return set_jobs
@@ -0,0 +1,29 @@
+import subprocess,threading
+from pyqsub.benchmark import FakeScheduler,load_benchmark
+from pyqsub.tracker import iter_qstat
+def qsub():
+    process=subprocess.Popen(['qsub'],stdin=subprocess.PIPE,stdout=subprocess.PIPE,stderr=subprocess.PIPE)
+    out=process.communicate(b'')[0]
+    return out.decode().strip() if not process.returncode else None
+def test_fake_qsub_concurrent(scheduler):
+    job_ids=[]
+    def submit():
+        for i in range(10):
+            job_ids.append(qsub())
+    threads=[threading.Thread(target=submit) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(job_ids,key=lambda job_id:int(job_id.split('.')[0]))==[str(i)+'.fakeserver' for i in range(1,81)]
+def test_fake_qstat(scheduler):
+    qsub()
+    qsub()
+    assert [(job['Job_Id'],job['job_state'],job['exit_status']) for job in iter_qstat()]==[('1.fakeserver','C','0'),('2.fakeserver','C','0')]
+def test_fake_failures():
+    with FakeScheduler(failure_rate=1.):
+        assert qsub() is None
+def test_load_benchmark():
+    results=load_benchmark(['make_optstr','submit'],[5],failure_rate=0.2,memory=False)
+    assert [(result['workload'],result['jobs']) for result in results]==[('make_optstr',5),('submit',5)]
+    assert results[1]['failures']==1
@@ -0,0 +1,57 @@
+import os
+import pytest
+from pyqsub.__core__ import submit,ScriptTemplate
+from pyqsub.cache import SubmissionCache,script_key
+SCRIPT='#!/bin/sh\n#PBS -N job\n## submitted by pyqsub\necho 1\n'
+@pytest.fixture
+def cache_path(scheduler):
+    return os.path.join(scheduler.path,'cache.db')
+def test_script_key():
+    assert script_key(SCRIPT)==script_key('#!/bin/sh  \n\n#PBS -N job\necho 1')
+    assert script_key(SCRIPT)!=script_key(SCRIPT.replace('echo 1','echo 2'))
+def test_lookup_missing(cache_path,qstat):
+    assert SubmissionCache(cache_path,ttl=0,qstat=qstat({})).lookup(SCRIPT) is None
+def test_lookup_running(cache_path,qstat):
+    cache=SubmissionCache(cache_path,ttl=0,qstat=qstat({'1.fakeserver':'R'}))
+    cache.add(SCRIPT,'1.fakeserver','job')
+    assert cache.lookup(SCRIPT)=='1.fakeserver'
+def test_lookup_succeeded(cache_path,qstat):
+    cache=SubmissionCache(cache_path,ttl=0,qstat=qstat({'1.fakeserver':('C',0)}))
+    cache.add(SCRIPT,'1.fakeserver','job')
+    assert cache.lookup(SCRIPT)=='1.fakeserver'
+    #Successful jobs are not checked again
+    qstat({'1.fakeserver':('C',1)})
+    assert SubmissionCache(cache_path,ttl=0,qstat=qstat({})).lookup(SCRIPT)=='1.fakeserver'
+def test_lookup_failed(cache_path,qstat):
+    cache=SubmissionCache(cache_path,ttl=0,qstat=qstat({'1.fakeserver':('C',1)}))
+    cache.add(SCRIPT,'1.fakeserver','job')
+    assert cache.lookup(SCRIPT) is None
+    assert SubmissionCache(cache_path,ttl=0,qstat=qstat({})).lookup(SCRIPT) is None
+def test_lookup_not_listed(cache_path,qstat):
+    cache=SubmissionCache(cache_path,ttl=0,qstat=qstat({}))
+    cache.add(SCRIPT,'1.fakeserver','job')
+    #The exit status of jobs that are no longer listed is unknown, so they are not resubmitted
+    assert cache.lookup(SCRIPT)=='1.fakeserver'
+    assert cache.lookup(SCRIPT)=='1.fakeserver'
+def test_evict(cache_path):
+    cache=SubmissionCache(cache_path,max_entries=2)
+    for i in range(3):
+        cache.add(SCRIPT+str(i),str(i)+'.fakeserver')
+    assert cache.evict()==1
+def test_submit(cache_path,options):
+    options,options_map=options
+    options=dict(options,qsub_cache=cache_path)
+    assert submit(dict(options),options_map,'module_name')=='1.fakeserver'
+    assert submit(dict(options),options_map,'module_name')=='1.fakeserver'
+    assert submit(dict(options,option_0=['9','x']),options_map,'module_name')=='2.fakeserver'
+    assert submit(dict(options,qsub_force=True),options_map,'module_name')=='3.fakeserver'
+def test_submit_backend(cache_path,options):
+    options,options_map=options
+    with pytest.raises(ValueError):
+        submit(dict(options,qsub_cache=cache_path,qsub_backend='slurm'),options_map,'module_name')
+def test_template_submit(cache_path,options):
+    options,options_map=options
+    template=ScriptTemplate(dict(options,qsub_cache=cache_path),options_map,'module_name')
+    assert template.submit()=='1.fakeserver'
+    assert template.submit()=='1.fakeserver'
+    assert template.submit({'qsub_force':True})=='2.fakeserver'
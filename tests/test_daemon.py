@@ -0,0 +1,50 @@
+import json,os,socket,threading,time
+import pytest
+from pyqsub.__core__ import QsubError
+from pyqsub.daemon import SubmissionServer,daemon_submit,check_spec,_Request
+@pytest.fixture
+def server(scheduler):
+    server=SubmissionServer(os.path.join(scheduler.path,'pyqsub.sock'),batch_window=0.01)
+    thread=threading.Thread(target=server.serve_forever)
+    thread.daemon=True
+    thread.start()
+    start=time.time()
+    while not os.path.exists(server.socket_path) and time.time()-start<10:
+        time.sleep(0.01)
+    yield server
+    server.shutdown()
+    thread.join(10)
+def send_lines(socket_path,lines):
+    client=socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        client.sendall(''.join(line+'\n' for line in lines).encode('utf-8'))
+        replies=client.makefile('rb')
+        return [json.loads(replies.readline().decode('utf-8')) for line in lines]
+    finally:
+        client.close()
+def test_check_spec():
+    check_spec({'options':{'qsub_N':'job'},'job_string':'echo 1'})
+    for spec in ([],{'job_string':1},{'options':[],'job_string':'echo 1'},{'module_name':'a','unknown':1},{'options':{}}):
+        with pytest.raises(ValueError):
+            check_spec(spec)
+def test_round_trip(server):
+    assert daemon_submit({'qsub_N':'job'},job_string='echo 1\n',socket_path=server.socket_path)=='1.fakeserver'
+    assert os.path.exists('job.p1')
+def test_invalid_requests(server):
+    replies=send_lines(server.socket_path,['not json','[]',json.dumps({'options':{}}),json.dumps({'job_string':'echo 1\n'})])
+    assert all('invalid request' in reply['error'] for reply in replies[:3])
+    assert replies[3]=={'job_id':'1.fakeserver'}
+def test_submit_error(server):
+    with pytest.raises(QsubError):
+        daemon_submit({'qsub_ppn':8,'qsub_ranks_per_node':3,'qsub_threads':3},job_string='echo 1\n',socket_path=server.socket_path)
+    assert daemon_submit(job_string='echo 1\n',socket_path=server.socket_path)=='1.fakeserver'
+def test_submit_batch(scheduler):
+    server=SubmissionServer(os.path.join(scheduler.path,'pyqsub.sock'))
+    requests=[_Request({'options':{'qsub_N':'batch'},'job_string':'echo '+str(i)}) for i in range(3)]
+    requests.append(_Request({'options':{'qsub_N':'batch','qsub_q':'other'},'job_string':'echo 3'}))
+    server.submit_batch(requests)
+    assert all(request.done.is_set() for request in requests)
+    #The jobs with the same qsub options are submitted as one array job
+    assert [request.response for request in requests]==[{'job_id':'1[0].fakeserver'},{'job_id':'1[1].fakeserver'},{'job_id':'1[2].fakeserver'},
+                                                        {'job_id':'2.fakeserver'}]
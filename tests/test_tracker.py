@@ -0,0 +1,42 @@
+from pyqsub.tracker import JobTracker,short_id
+def test_short_id():
+    assert short_id('1234.server')=='1234'
+    assert short_id('1234[5].server')=='1234[5]'
+def test_refresh(qstat):
+    tracker=JobTracker(ttl=0,qstat=qstat({'1.fakeserver':'R','2.fakeserver':('C',0),'3.fakeserver':('C',1)}))
+    tracker.track('1.fakeserver','2.fakeserver','3.fakeserver','4.fakeserver')
+    tracker.refresh()
+    assert tracker.state('1.fakeserver')=='R'
+    assert tracker.exit_status('1.fakeserver') is None
+    assert tracker.state('2.fakeserver')=='C'
+    assert tracker.exit_status('2.fakeserver')==0
+    assert tracker.exit_status('3.fakeserver')==1
+    #Jobs that are no longer listed have finished with an unknown exit status
+    assert tracker.done('4.fakeserver')
+    assert tracker.exit_status('4.fakeserver') is None
+def test_refresh_ttl(qstat):
+    tracker=JobTracker(ttl=3600,qstat=qstat({'1.fakeserver':'R'}))
+    tracker.track('1.fakeserver')
+    assert tracker.state('1.fakeserver')=='R'
+    qstat({'1.fakeserver':('C',0)})
+    assert tracker.state('1.fakeserver')=='R'
+    tracker.refresh(force=True)
+    assert tracker.state('1.fakeserver')=='C'
+def test_submit_and_wait(scheduler,options):
+    tracker=JobTracker(ttl=0)
+    job_ids=[tracker.submit(*options,module_name='module_name') for i in range(3)]
+    assert job_ids==['1.fakeserver','2.fakeserver','3.fakeserver']
+    assert tracker.wait(timeout=10,interval=0.01)
+    assert all(tracker.exit_status(job_id)==0 for job_id in job_ids)
+def test_wait_timeout(qstat):
+    tracker=JobTracker(ttl=0,qstat=qstat({'1.fakeserver':'R'}))
+    assert not tracker.wait(['1.fakeserver'],timeout=0.05,interval=0.01)
+def test_as_completed(qstat):
+    tracker=JobTracker(ttl=0,qstat=qstat({'1.fakeserver':'R','2.fakeserver':('C',0)}))
+    completed=tracker.as_completed(['1.fakeserver','2.fakeserver','2.fakeserver'],timeout=10,interval=0.01)
+    assert next(completed)=='2.fakeserver'
+    qstat({'1.fakeserver':('C',0)})
+    assert list(completed)==['1.fakeserver']
+def test_as_completed_timeout(qstat):
+    tracker=JobTracker(ttl=0,qstat=qstat({'1.fakeserver':'R','2.fakeserver':('C',0)}))
+    assert list(tracker.as_completed(['1.fakeserver','2.fakeserver'],timeout=0.05,interval=0.01))==['2.fakeserver']
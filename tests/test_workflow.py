@@ -0,0 +1,64 @@
+import os
+import pytest
+from pyqsub.workflow import Workflow
+def depend(path):
+    with open(path) as f:
+        lines=[line for line in f if line.startswith('#PBS -W depend=')]
+    return lines[0].strip()[len('#PBS -W depend='):] if lines else False
+def job(name,**options):
+    return dict(dict(qsub_N=name,qsub_nodes=1,qsub_ppn=1,qsub_pmem=1.,qsub_walltime='01:00:00',qsub_q='auto',qsub_M=False,qsub_m='bae',
+                     qsub_blade_properties=False,qsub_blade_feature=False),**options)
+def test_chain(scheduler):
+    workflow=Workflow()
+    workflow.add(job('a'),job_string='echo a\n')
+    workflow.add(job('b'),job_string='echo b\n',after=['a'])
+    workflow.add(job('c'),job_string='echo c\n',after=['a','b'])
+    assert workflow.submit()=={'a':'1.fakeserver','b':'2.fakeserver','c':'3.fakeserver'}
+    assert depend('a.p1') is False
+    assert depend('b.p2')=='afterok:1.fakeserver'
+    assert depend('c.p3')=='afterok:1.fakeserver:2.fakeserver'
+def test_topological_order(scheduler):
+    workflow=Workflow()
+    workflow.add(job('b'),job_string='echo b\n',after=['a'])
+    workflow.add(job('a'),job_string='echo a\n')
+    assert workflow.topological_order()==['a','b']
+    assert workflow.submit()=={'a':'1.fakeserver','b':'2.fakeserver'}
+    assert depend('b.p2')=='afterok:1.fakeserver'
+def test_array(scheduler):
+    workflow=Workflow()
+    workflow.add_array(job('a'),job_string=['echo 0','echo 1'],name='a')
+    workflow.add(job('b'),job_string='echo b\n',after=['a'])
+    assert workflow.submit()=={'a':['1[0].fakeserver','1[1].fakeserver'],'b':'2.fakeserver'}
+    assert depend('b.p2')=='afterokarray:1[].fakeserver'
+def test_existing_depend(scheduler):
+    workflow=Workflow()
+    workflow.add(job('a'),job_string='echo a\n')
+    workflow.add(job('b',qsub_depend='afterany:99.fakeserver'),job_string='echo b\n',after=['a'])
+    workflow.submit()
+    assert depend('b.p2')=='afterany:99.fakeserver,afterok:1.fakeserver'
+def test_aggregators(scheduler):
+    workflow=Workflow(max_dependencies=2)
+    for name in 'abc':
+        workflow.add(job(name),job_string='echo '+name+'\n')
+    workflow.add(job('d'),job_string='echo d\n',after=['a','b','c'])
+    job_ids=workflow.submit()
+    assert job_ids['d']=='6.fakeserver'
+    #Each aggregator depends on at most max_dependencies jobs, and the job depends on the aggregators
+    assert depend('d_agg.p4')=='afterok:1.fakeserver:2.fakeserver'
+    assert depend('d_agg.p5')=='afterok:3.fakeserver'
+    assert depend('d.p6')=='afterok:4.fakeserver:5.fakeserver'
+def test_cycle(scheduler):
+    workflow=Workflow()
+    workflow.add(job('a'),job_string='echo a\n',after=['b'])
+    workflow.add(job('b'),job_string='echo b\n',after=['a'])
+    with pytest.raises(ValueError):
+        workflow.submit()
+    assert not os.path.exists(os.path.join(scheduler.path,'counter'))
+def test_invalid_layout(scheduler):
+    workflow=Workflow()
+    workflow.add(job('a'),job_string='echo a\n')
+    workflow.add(job('b',qsub_ppn=8,qsub_ranks_per_node=3,qsub_threads=3),job_string='echo b\n',after=['a'])
+    with pytest.raises(ValueError):
+        workflow.submit()
+    #The layouts are checked before any job is submitted
+    assert not os.path.exists(os.path.join(scheduler.path,'counter'))
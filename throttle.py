@@ -0,0 +1,196 @@
+"""throttle
+******************
+
+Throttled submission queue for pyqsub.
+
+Jobs are added to a queue stored in a SQLite database, and released to the scheduler just fast enough to keep the number of the user's jobs in the
+scheduler under max_queued (Torque counts running jobs towards max_user_queuable, so they are included), pausing while max_running jobs are
+running. The occupancy is read with a single qstat -t -u $USER call per step, so a sweep of 100k jobs can be fed to the scheduler over days
+without hitting the per user limits. The queue is persistent, so it can be stopped and restarted and resumes with the next unsubmitted job::
+
+    from pyqsub.throttle import ThrottledQueue
+    queue=ThrottledQueue('sweep.db',max_queued=500)
+    queue.map([dict(options,seed=seed) for seed in range(100000)],options_map,module_name='module_name')
+    queue.run(interval=60)
+
+or, after a restart, from the command line::
+
+    python -m pyqsub.throttle sweep.db --maxqueued 500
+
+-------------------------------------------
+
+Copyright (c) 2015 David J Pugh
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
+import sys,json,sqlite3,subprocess,time
+try:
+    from .__core__ import submit,QsubError
+except (ImportError,ValueError,SystemError):
+    from __core__ import submit,QsubError
+RUNNING_STATES=('R','E')
+FINISHED_STATES=('C','F')
+def user_qstat():
+    """Returns the qstat command for the current user's jobs (qstat -t -u $USER)"""
+    import getpass
+    return ['qstat','-t','-u',getpass.getuser()]
+def occupancy(qstat=None):
+    """Returns the number of the user's jobs waiting and running in the scheduler
+
+    Parses the job lines (after the ---- separator line) of the qstat -u output, where the state is the second last column.
+
+    Args
+        qstat: list qstat command [default=qstat -t -u $USER]
+
+    Returns
+        waiting,running: int number of jobs waiting (e.g. Q, H, W) and running (R, E)
+
+    """
+    process=subprocess.Popen(qstat or user_qstat(),stdout=subprocess.PIPE,stderr=subprocess.PIPE)
+    out,err=process.communicate()
+    if process.returncode:
+        raise RuntimeError('qstat failed: '+err.decode().strip())
+    waiting=running=0
+    jobs=False
+    for line in out.decode().splitlines():
+        parts=line.split()
+        if not jobs:
+            jobs=bool(parts) and set(line.strip())<=set('- ')
+            continue
+        if len(parts)<2:
+            continue
+        if parts[-2] in RUNNING_STATES:
+            running+=1
+        elif parts[-2] not in FINISHED_STATES:
+            waiting+=1
+    return waiting,running
+class ThrottledQueue(object):
+    """Persistent submission queue that keeps the user's jobs under the scheduler limits
+
+    Args
+        path: str SQLite database path
+        max_queued: int maximum number of the user's jobs in the scheduler (waiting and running) [default=1000]
+        max_running: int no jobs are released while this many of the user's jobs are running, or None for no limit [default=None]
+        qstat: list qstat command [default=qstat -t -u $USER]
+
+    """
+    def __init__(self,path,max_queued=1000,max_running=None,qstat=None):
+        self.path=path
+        self.max_queued=max_queued
+        self.max_running=max_running
+        self.qstat=qstat or user_qstat()
+        self._connection=sqlite3.connect(path,timeout=30)
+        with self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS queue (id INTEGER PRIMARY KEY AUTOINCREMENT, spec TEXT, job_id TEXT, submitted REAL, error TEXT)')
+            if 'error' not in [column[1] for column in self._connection.execute('PRAGMA table_info(queue)')]:
+                self._connection.execute('ALTER TABLE queue ADD COLUMN error TEXT')#Queues created before errors were recorded
+            self._connection.execute('CREATE INDEX IF NOT EXISTS queue_job_id ON queue (job_id)')
+    def close(self):
+        """Closes the database"""
+        self._connection.close()
+    def put(self,options,options_map={},module_name=False,job_string=False,list_delimiter=','):
+        """Adds a job to the queue
+
+        Takes the same arguments as pyqsub.submit() (the options must be JSON serialisable).
+
+        Returns
+            id: int queue id of the job
+
+        """
+        return self.map([options],options_map,module_name,job_string,list_delimiter)[0]
+    def map(self,options,options_map={},module_name=False,job_string=False,list_delimiter=','):
+        """Adds a job for each options dict to the queue (in a single transaction)
+
+        Args:
+            options: iterable of dicts of options and values
+
+        Other arguments are as for pyqsub.submit()
+
+        Returns
+            ids: list of queue ids, one for each job
+
+        """
+        if not module_name and not job_string:
+            raise TypeError("One of module_name and job_string must be specified.")
+        ids=[]
+        with self._connection:
+            for job_options in options:
+                spec={'options':job_options,'options_map':options_map,'module_name':module_name,'job_string':job_string,'list_delimiter':list_delimiter}
+                ids.append(self._connection.execute('INSERT INTO queue (spec) VALUES (?)',(json.dumps(spec),)).lastrowid)
+        return ids
+    def pending(self):
+        """Returns the number of jobs waiting to be submitted (excluding jobs that failed with an error)"""
+        return self._connection.execute('SELECT COUNT(*) FROM queue WHERE job_id IS NULL AND error IS NULL').fetchone()[0]
+    def job_ids(self):
+        """Returns a dict of queue id to job id for the submitted jobs"""
+        return dict(self._connection.execute('SELECT id, job_id FROM queue WHERE job_id IS NOT NULL'))
+    def errors(self):
+        """Returns a dict of queue id to error message for the jobs that could not be submitted"""
+        return dict(self._connection.execute('SELECT id, error FROM queue WHERE error IS NOT NULL'))
+    def step(self):
+        """Releases as many jobs as the limits allow, using one qstat call for the occupancy
+
+        Submission stops at the first failed qsub call (e.g. if the limit has been reached by other submissions), and the job is retried
+        on the next step. Jobs that fail for any other reason (e.g. invalid options) are marked with the error (see ThrottledQueue.errors())
+        and skipped.
+
+        Returns
+            n: int number of jobs submitted
+
+        """
+        waiting,running=occupancy(self.qstat)
+        if self.max_running is not None and running>=self.max_running:
+            return 0
+        free=self.max_queued-waiting-running
+        if free<=0:
+            return 0
+        n=0
+        for queue_id,spec in list(self._connection.execute('SELECT id, spec FROM queue WHERE job_id IS NULL AND error IS NULL ORDER BY id LIMIT ?',(free,))):
+            try:
+                spec=json.loads(spec)
+                job_id=submit(spec['options'],spec['options_map'],spec['module_name'],spec['job_string'],spec['list_delimiter'])
+            except QsubError:
+                break
+            except Exception as e:
+                with self._connection:
+                    self._connection.execute('UPDATE queue SET error=? WHERE id=?',(e.__class__.__name__+': '+str(e),queue_id))
+                continue
+            with self._connection:
+                self._connection.execute('UPDATE queue SET job_id=?, submitted=? WHERE id=?',(job_id,time.time(),queue_id))
+            n+=1
+        return n
+    def run(self,interval=60.):
+        """Releases the queued jobs until all have been submitted
+
+        Args
+            interval: float time in seconds between steps [default=60]
+
+        """
+        while self.pending():
+            self.step()
+            if self.pending():
+                time.sleep(interval)
+def __run__(inputArgs=[]):
+    import argparse
+    parser=argparse.ArgumentParser(prog='python -m pyqsub.throttle',description="Release the jobs in a pyqsub throttled queue")
+    parser.add_argument('path',type=str,help="Queue database path")
+    parser.add_argument('--maxqueued',type=int,default=1000,help="Set the maximum number of jobs in the scheduler. [default=1000]",dest='max_queued')
+    parser.add_argument('--maxrunning',type=int,default=None,help="Pause while this many jobs are running. [default=None]",dest='max_running')
+    parser.add_argument('--interval',type=float,default=60.,help="Set the time in seconds between qstat checks. [default=60]",dest='interval')
+    options=parser.parse_args(inputArgs or sys.argv[1:])
+    queue=ThrottledQueue(options.path,options.max_queued,options.max_running)
+    try:
+        queue.run(options.interval)
+    except KeyboardInterrupt:
+        pass
+if __name__=="__main__":
+    __run__()
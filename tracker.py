@@ -0,0 +1,190 @@
+"""tracker
+******************
+
+Job status tracking for pyqsub.
+
+-------------------------------------------
+
+Copyright (c) 2015 David J Pugh
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
+import subprocess,threading,time
+import xml.etree.ElementTree as ElementTree
+try:
+    from .__core__ import submit,submit_array
+except (ImportError,ValueError,SystemError):
+    from __core__ import submit,submit_array
+FINISHED_STATES=('C','F')
+def short_id(job_id):
+    """Returns the job id without the server name (e.g. 123[4] for 123[4].server.domain)"""
+    return str(job_id).split('.')[0]
+def iter_qstat(args=['qstat','-x','-t']):
+    """Iterates over the jobs in the qstat XML output
+
+    The output is parsed incrementally, so the full output for a busy server is never held in memory.
+
+    Args
+        args: list qstat command [default=['qstat','-x','-t']]
+
+    Returns
+        jobs: generator of dicts of job attributes, nested attributes are joined with a . (e.g. resources_used.walltime)
+
+    """
+    process=subprocess.Popen(args,stdout=subprocess.PIPE,stderr=subprocess.PIPE)
+    try:
+        for event,element in ElementTree.iterparse(process.stdout):
+            if element.tag!='Job':
+                continue
+            job={}
+            for child in element:
+                if len(child):
+                    for grandchild in child:
+                        job[child.tag+'.'+grandchild.tag]=grandchild.text
+                else:
+                    job[child.tag]=child.text
+            element.clear()
+            yield job
+    except ElementTree.ParseError:
+        pass#No jobs gives empty output
+    finally:
+        process.stdout.close()
+        err=process.stderr.read()
+        process.stderr.close()
+        if process.wait():
+            raise RuntimeError('qstat failed: '+err.decode().strip())
+class JobTracker(object):
+    """Tracks the state of submitted jobs
+
+    The state of all the tracked jobs is refreshed using a single qstat call, and cached for ttl seconds, so many jobs can be
+    polled without a qstat call per job. Jobs that are no longer listed by qstat are assumed to have finished.
+
+    Args
+        ttl: float time in seconds to cache job states for [default=30]
+        qstat: list qstat command (must return XML) [default=['qstat','-x','-t']]
+
+    """
+    def __init__(self,ttl=30.,qstat=['qstat','-x','-t']):
+        self.ttl=ttl
+        self.qstat=qstat
+        self.jobs={}
+        self.last_refresh=None
+        self._lock=threading.Lock()
+    def track(self,*job_ids):
+        """Adds job ids to the tracker"""
+        with self._lock:
+            for job_id in job_ids:
+                self.jobs.setdefault(short_id(job_id),{'job_state':'Q','exit_status':None})
+    def submit(self,*args,**kwargs):
+        """Submits job to cluster using pyqsub.submit() and tracks it
+
+        Returns
+            job_id: str job id returned by qsub
+
+        """
+        job_id=submit(*args,**kwargs)
+        self.track(job_id)
+        return job_id
+    def submit_array(self,*args,**kwargs):
+        """Submits jobs to cluster using pyqsub.submit_array() and tracks them
+
+        Returns
+            job_ids: list of job ids
+
+        """
+        job_ids=submit_array(*args,**kwargs)
+        self.track(*job_ids)
+        return job_ids
+    def refresh(self,force=False):
+        """Refreshes the job states using a single qstat call if the cache has expired
+
+        Args
+            force: bool refresh even if the cache has not expired [default=False]
+
+        """
+        with self._lock:
+            if not force and self.last_refresh is not None and time.time()-self.last_refresh<self.ttl:
+                return
+            active=set(job_id for job_id,job in self.jobs.items() if job['job_state'] not in FINISHED_STATES)
+            if not active:
+                self.last_refresh=time.time()
+                return
+            for job in iter_qstat(self.qstat):
+                job_id=short_id(job.get('Job_Id'))
+                if job_id in self.jobs:
+                    self.jobs[job_id]['job_state']=job.get('job_state')
+                    if job.get('exit_status') is not None:
+                        self.jobs[job_id]['exit_status']=int(job['exit_status'])
+                    active.discard(job_id)
+            for job_id in active:
+                self.jobs[job_id]['job_state']='C'
+            self.last_refresh=time.time()
+    def state(self,job_id):
+        """Returns the (cached) state of a job (e.g. Q, R, C)"""
+        self.refresh()
+        return self.jobs[short_id(job_id)]['job_state']
+    def exit_status(self,job_id):
+        """Returns the exit status of a job, or None if it is not known"""
+        self.refresh()
+        return self.jobs[short_id(job_id)]['exit_status']
+    def done(self,job_id):
+        """Returns True if the job has finished"""
+        return self.state(job_id) in FINISHED_STATES
+    def as_completed(self,jobs=None,timeout=None,interval=None):
+        """Iterates over jobs as they finish
+
+        Args
+            jobs: list of job ids [default=all tracked jobs]
+            timeout: float maximum time in seconds to wait, iteration stops when the timeout is reached [default=None]
+            interval: float polling interval in seconds [default=ttl]
+
+        Returns
+            job_ids: generator of finished job ids
+
+        """
+        if jobs is None:
+            jobs=list(self.jobs.keys())
+        self.track(*jobs)
+        interval=self.ttl if interval is None else interval
+        remaining=[]
+        seen=set()
+        for job_id in jobs:
+            if short_id(job_id) not in seen:
+                seen.add(short_id(job_id))
+                remaining.append(job_id)
+        start=time.time()
+        while remaining:
+            for job_id in [job_id for job_id in remaining if self.done(job_id)]:
+                remaining.remove(job_id)
+                yield job_id
+            if not remaining or (timeout is not None and time.time()-start>=timeout):
+                return
+            wait=interval if timeout is None else min(interval,max(timeout-(time.time()-start),0))
+            time.sleep(wait)
+            self.refresh(force=True)
+    def wait(self,jobs=None,timeout=None,interval=None):
+        """Waits for jobs to finish
+
+        Args
+            jobs: list of job ids [default=all tracked jobs]
+            timeout: float maximum time in seconds to wait [default=None]
+            interval: float polling interval in seconds [default=ttl]
+
+        Returns
+            finished: bool True if all the jobs have finished
+
+        """
+        if jobs is None:
+            jobs=list(self.jobs.keys())
+        for job_id in self.as_completed(jobs,timeout,interval):
+            pass
+        return all(self.done(job_id) for job_id in jobs)
@@ -0,0 +1,182 @@
+"""workflow
+******************
+
+Dependency-aware workflow submission for pyqsub.
+
+-------------------------------------------
+
+Copyright (c) 2015 David J Pugh
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+IN THE SOFTWARE.
+"""
+try:
+    from .__core__ import submit,submit_array
+    from .backends import get_backend,mpi_layout,LocalBackend
+except (ImportError,ValueError,SystemError):
+    from __core__ import submit,submit_array
+    from backends import get_backend,mpi_layout,LocalBackend
+AGGREGATOR_OPTIONS=('qsub_q','qsub_backend','qsub_outdir')
+class Workflow(object):
+    """Workflow of jobs with dependencies
+
+    Jobs are added with the names of the jobs they depend on, and Workflow.submit() submits them in topological order with
+    afterok dependencies (#PBS -W depend=afterok:<ids>, or afterokarray:<id> for array jobs), so the scheduler handles the ordering
+    and nothing waits on the client. If a job depends on more than max_dependencies jobs, small aggregator jobs are submitted that
+    each depend on at most max_dependencies of them, and the job depends on the aggregators instead. The aggregators only use the queue,
+    backend and output directory options of the job.
+
+    The local backend has no scheduler to handle the dependencies, so Workflow.submit() waits for the dependencies of each job to
+    finish before submitting it.
+
+    Args
+        max_dependencies: int maximum number of jobs in a single dependency list [default=100]
+
+    """
+    def __init__(self,max_dependencies=100):
+        if max_dependencies<2:
+            raise ValueError("max_dependencies must be at least 2.")
+        self.max_dependencies=max_dependencies
+        self.jobs={}
+        self.order=[]
+        self.job_ids={}
+    def add(self,options,options_map={},module_name=False,job_string=False,list_delimiter=',',after=(),name=None):
+        """Adds a job to the workflow
+
+        Takes the same arguments as pyqsub.submit(), and:
+
+        Args
+            after: list of names of jobs that must finish successfully before this job runs [default=()]
+            name: str job name in the workflow [default=options['qsub_N'] or job<n>]
+
+        Returns
+            name: str job name in the workflow
+
+        """
+        return self._add(name,dict(options=options,options_map=options_map,module_name=module_name,job_string=job_string,
+                                   list_delimiter=list_delimiter,after=list(after),array=False))
+    def add_array(self,options,options_map={},module_name=False,job_string=False,list_delimiter=',',after=(),name=None):
+        """Adds an array job to the workflow
+
+        Takes the same arguments as pyqsub.submit_array(), and:
+
+        Args
+            after: list of names of jobs that must finish successfully before this job runs [default=()]
+            name: str job name in the workflow [default=job<n>]
+
+        Returns
+            name: str job name in the workflow
+
+        """
+        return self._add(name,dict(options=options,options_map=options_map,module_name=module_name,job_string=job_string,
+                                   list_delimiter=list_delimiter,after=list(after),array=True))
+    def _add(self,name,job):
+        if name is None:
+            name=job['options'].get('qsub_N') if isinstance(job['options'],dict) and not job['array'] else None
+            if name is None or name in self.jobs:
+                name='job'+str(len(self.order))
+        if name in self.jobs:
+            raise ValueError("Job "+name+" is already in the workflow.")
+        self.jobs[name]=job
+        self.order.append(name)
+        return name
+    def topological_order(self):
+        """Returns the job names in topological order
+
+        Returns
+            order: list of job names, with each job after the jobs it depends on
+
+        """
+        for name in self.order:
+            for dependency in self.jobs[name]['after']:
+                if dependency not in self.jobs:
+                    raise ValueError("Job "+name+" depends on unknown job "+str(dependency)+".")
+        n_dependencies=dict((name,len(set(self.jobs[name]['after']))) for name in self.order)
+        dependents=dict((name,[]) for name in self.order)
+        for name in self.order:
+            for dependency in set(self.jobs[name]['after']):
+                dependents[dependency].append(name)
+        ready=[name for name in self.order if not n_dependencies[name]]
+        order=[]
+        while ready:
+            name=ready.pop(0)
+            order.append(name)
+            for dependent in dependents[name]:
+                n_dependencies[dependent]-=1
+                if not n_dependencies[dependent]:
+                    ready.append(dependent)
+        if len(order)!=len(self.order):
+            raise ValueError("Workflow has a dependency cycle between jobs "+', '.join(name for name in self.order if name not in order)+".")
+        return order
+    def submit(self):
+        """Submits the workflow
+
+        Returns
+            job_ids: dict mapping job names to job ids (lists of job ids for array jobs)
+
+        """
+        order=self.topological_order()
+        for name in order:
+            #Check the MPI layouts first so that an invalid job does not leave the workflow partly submitted
+            options=self.jobs[name]['options']
+            for job_options in ([options] if isinstance(options,dict) else options):
+                if job_options.get('qsub_ranks_per_node') or job_options.get('qsub_threads'):
+                    mpi_layout(job_options)
+        for name in order:
+            if name in self.job_ids:
+                continue
+            job=self.jobs[name]
+            options=job['options']
+            first_options=options if isinstance(options,dict) else options[0]
+            backend=get_backend(first_options.get('qsub_backend','pbs'))
+            depend=self._depend(name,first_options,backend)
+            if depend:
+                if isinstance(options,dict):
+                    options=self._with_depend(options,depend)
+                else:
+                    options=[self._with_depend(job_options,depend) for job_options in options]
+            if job['array']:
+                self.job_ids[name]=submit_array(options,job['options_map'],job['module_name'],job['job_string'],job['list_delimiter'])
+            else:
+                self.job_ids[name]=submit(options,job['options_map'],job['module_name'],job['job_string'],job['list_delimiter'])
+        return dict(self.job_ids)
+    def _with_depend(self,options,depend):
+        options=dict(options)
+        options['qsub_depend']=options['qsub_depend']+','+depend if options.get('qsub_depend',False) else depend
+        return options
+    def _depend(self,name,options,backend):
+        job_ids=[]
+        array_ids=[]
+        for dependency in self.jobs[name]['after']:
+            if self.jobs[dependency]['array']:
+                array_ids.append(backend.array_id(self.job_ids[dependency]))
+            else:
+                job_ids.append(self.job_ids[dependency])
+        if isinstance(backend,LocalBackend):
+            for dependency in self.jobs[name]['after']:
+                for job_id in (self.job_ids[dependency] if self.jobs[dependency]['array'] else [self.job_ids[dependency]]):
+                    backend.result(job_id)
+            return False
+        while len(job_ids)+len(array_ids)>self.max_dependencies:
+            aggregators=[]
+            dependencies=[(job_id,False) for job_id in job_ids]+[(array_id,True) for array_id in array_ids]
+            for i in range(0,len(dependencies),self.max_dependencies):
+                chunk=dependencies[i:i+self.max_dependencies]
+                #Only the queue, backend and output directory are taken from the job, so e.g. its MPI layout, cache and advisor are not used
+                aggregator_options=dict((key,options[key]) for key in AGGREGATOR_OPTIONS if key in options)
+                aggregator_options.update(qsub_N=str(options['qsub_N'])+'_agg',qsub_nodes=1,qsub_ppn=1,qsub_pmem=False,qsub_walltime='00:05:00',
+                                          qsub_M=False,qsub_m='',qsub_blade_properties=False,qsub_blade_feature=False,
+                                          qsub_depend=backend.depend([job_id for job_id,array in chunk if not array],[job_id for job_id,array in chunk if array]))
+                aggregators.append(submit(aggregator_options,job_string='true\n'))
+            job_ids,array_ids=aggregators,[]
+        if not job_ids and not array_ids:
+            return False
+        return backend.depend(job_ids,array_ids)